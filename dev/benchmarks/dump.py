@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Compare the month file serializer with yaml.dump() using the libyaml and
+the pure Python dumpers.
+"""
+
+import os.path
+import random
+import sys
+import timeit
+
+import yaml
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(os.path.dirname(DIR))
+
+sys.path.insert(0, REPO)
+
+from rednotebook import storage  # noqa: E402
+
+DAYS = 31
+WORDS_PER_DAY = 300
+ITERATIONS = 10
+
+
+def get_month_content():
+    rng = random.Random(0)
+    vocabulary = ['word{}'.format(number) for number in range(1000)] + ['#tag', 'ümlaut:']
+    content = {}
+    for day_number in range(1, DAYS + 1):
+        lines = [' '.join(rng.choices(vocabulary, k=WORDS_PER_DAY // 10)) for _ in range(10)]
+        content[day_number] = {
+            'text': '\n'.join(lines),
+            'Work': {'Meeting with {}'.format(day_number): None},
+            'Done': None,
+        }
+    return content
+
+
+def main():
+    content = get_month_content()
+    document = storage._dump_month(content)
+    assert yaml.load(document, Loader=storage.Loader) == content
+    print('Month file: {} bytes'.format(len(document.encode('utf-8'))))
+
+    dumpers = [('_dump_month', lambda: storage._dump_month(content))]
+    if hasattr(yaml, 'CSafeDumper'):
+        dumpers.append(('CSafeDumper', lambda: yaml.dump(
+            content, Dumper=yaml.CSafeDumper, allow_unicode=True)))
+    dumpers.append(('SafeDumper', lambda: yaml.dump(
+        content, Dumper=yaml.SafeDumper, allow_unicode=True)))
+
+    for name, dump in dumpers:
+        seconds = min(timeit.repeat(dump, repeat=ITERATIONS, number=1))
+        print('{:<12} {:8.2f} ms'.format(name, seconds * 1000))
+
+
+main()
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 import os.path
 import sys
@@ -9,6 +9,8 @@ REPO = os.path.dirname(os.path.dirname(DIR))
 
 sys.path.insert(0, REPO)
 
+from rednotebook.data import HASHTAG, find_hashtags  # noqa: E402
+
 N = 2500
 TEXTS = [
     "aa " * N,
@@ -17,9 +19,16 @@ TEXTS = [
     "== " * N,
     "$$ " * N,
     "$= " * N,
+    "#1 " * N,
+    "#" + "1" * N,
+    "#tag " * N,
+    "#" * N,
 ]
 ITERATIONS = 10**0
 
 for text in TEXTS:
-    timer = timeit.Timer('HASHTAG.findall(text)', setup='from rednotebook.data import HASHTAG; text = "{text}"'.format(**locals()))
-    print text[:10], timer.timeit(ITERATIONS)
+    assert find_hashtags(text) == [tag for _, _hash, tag in HASHTAG.findall(text)]
+    regex_time = timeit.timeit(lambda: HASHTAG.findall(text), number=ITERATIONS)
+    fast_time = timeit.timeit(lambda: find_hashtags(text), number=ITERATIONS)
+    print('{:<12} HASHTAG.findall: {:.6f}s  find_hashtags: {:.6f}s'.format(
+        repr(text[:10]), regex_time, fast_time))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Compare the throughput of the month file parser with the libyaml and the
+pure Python PyYAML loaders.
+"""
+
+import os.path
+import random
+import sys
+import timeit
+
+import yaml
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(os.path.dirname(DIR))
+
+sys.path.insert(0, REPO)
+
+from rednotebook import storage  # noqa: E402
+
+DAYS = 31
+WORDS_PER_DAY = 300
+ITERATIONS = 10
+
+
+def get_month_document():
+    rng = random.Random(0)
+    vocabulary = ['word{}'.format(number) for number in range(1000)] + ['#tag', 'ümlaut:']
+    content = {}
+    for day_number in range(1, DAYS + 1):
+        lines = [' '.join(rng.choices(vocabulary, k=WORDS_PER_DAY // 10)) for _ in range(10)]
+        content[day_number] = {
+            'text': '\n'.join(lines),
+            'Work': {'Meeting with {}'.format(day_number): None},
+            'Done': None,
+        }
+    return content, storage._dump_month(content)
+
+
+def main():
+    content, document = get_month_document()
+    megabytes = len(document.encode('utf-8')) / 10**6
+    assert storage._load_month(document) == content
+
+    loaders = [('_load_month', lambda: storage._load_month(document))]
+    if hasattr(yaml, 'CLoader'):
+        loaders.append(('CLoader', lambda: yaml.load(document, Loader=yaml.CLoader)))
+    loaders.append(('Loader', lambda: yaml.load(document, Loader=yaml.Loader)))
+
+    for name, load in loaders:
+        seconds = min(timeit.repeat(load, repeat=ITERATIONS, number=1))
+        print('{:<12} {:8.2f} ms {:8.2f} MB/s'.format(name, seconds * 1000, megabytes / seconds))
+
+
+main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+Measure how long it takes until the first batch of search results is
+available. For search-as-you-type, this must stay below LATENCY_TARGET
+milliseconds for a journal with ten years of entries.
+"""
+
+import datetime
+import itertools
+import os.path
+import random
+import sys
+import timeit
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(os.path.dirname(DIR))
+
+sys.path.insert(0, REPO)
+
+from rednotebook import data, index  # noqa: E402
+
+YEARS = 10
+WORDS_PER_DAY = 300
+VOCABULARY_SIZE = 20000
+LATENCY_TARGET = 50
+ITERATIONS = 10
+QUERIES = [
+    'w1',
+    'w1 w2',
+    'w500',
+    '"w1 w2"',
+    'w1 NEAR/5 w3',
+    'w1*',
+    '*99*',
+    'missing',
+]
+
+
+def get_index():
+    rng = random.Random(0)
+    vocabulary = ['w{}'.format(number) for number in range(VOCABULARY_SIZE)]
+    # Zipf-like word frequencies.
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    search_index = index.Index()
+    days = {}
+    date = datetime.date(2000, 1, 1)
+    month = None
+    for _ in range(YEARS * 365):
+        if month is None or month.month_number != date.month:
+            month = data.Month(date.year, date.month)
+        text = ' '.join(rng.choices(vocabulary, weights, k=WORDS_PER_DAY))
+        day = data.Day(month, date.day, {'text': text})
+        search_index.add_day(day)
+        days[date] = day
+        date += datetime.timedelta(days=1)
+    return search_index, days
+
+
+def get_first_batch(search_index, days, text, ranked):
+    """Get the results the search list shows first."""
+    results = search_index.search(days.__getitem__, text, [], ranked)
+    return list(itertools.islice(results, index.SEARCH_BATCH_SIZE))
+
+
+def main():
+    search_index, days = get_index()
+    print('Indexed {} days'.format(len(days)))
+    slow_queries = 0
+    for ranked in [False, True]:
+        for text in QUERIES:
+            timer = timeit.Timer(lambda: get_first_batch(search_index, days, text, ranked))
+            milliseconds = min(timer.repeat(repeat=ITERATIONS, number=1)) * 1000
+            slow = milliseconds > LATENCY_TARGET
+            slow_queries += slow
+            print('{:<14} ranked={:<5} {:8.2f} ms{}'.format(
+                text, str(ranked), milliseconds, '  (too slow)' if slow else ''))
+    sys.exit(1 if slow_queries else 0)
+
+
+main()
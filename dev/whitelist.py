@@ -24,3 +24,10 @@ imports.Importer._check_modules
 
 from rednotebook.util import utils
 utils.compute_ngrams
+
+from rednotebook.util import statistics
+statistics.Statistics.get_series
+statistics.Statistics.get_longest_streak
+
+from rednotebook import index
+index.TagIndex.get_cooccurrences
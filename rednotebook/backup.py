@@ -24,6 +24,8 @@ import zipfile
 
 from gi.repository import Gtk
 
+from rednotebook import storage
+
 
 DATE_FORMAT = '%Y-%m-%d'
 MAX_BACKUP_AGE = 30
@@ -84,9 +86,13 @@ class Archiver:
         self.journal.save_to_disk()
         data_dir = self.journal.dirs.data_dir
         archive_files = []
+        cache_dir = storage.get_cache_dir(data_dir)
         for root, dirs, files in os.walk(data_dir):
+            # Cached files can be recreated from the month files.
+            dirs[:] = [dir for dir in dirs if os.path.join(root, dir) != cache_dir]
             for file in files:
-                if not file.endswith('~') and 'RedNotebook-Backup' not in file:
+                if (not file.endswith('~') and 'RedNotebook-Backup' not in file and
+                        not storage.is_temporary_file(file)):
                     archive_files.append(os.path.join(root, file))
 
         write_archive(backup_file, archive_files, data_dir)
@@ -43,6 +43,9 @@ class Config(dict):
         'userDir': '',
         'firstStart': 1,
         'spellcheck': 0,
+        'parallelLoading': 0,
+        'lazyLoading': 0,
+        'rankSearchResults': 0,
         'mainFrameWidth': 1024,
         'mainFrameHeight': 700,
         'mainFrameMaximized': 0,
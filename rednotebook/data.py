@@ -17,6 +17,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------
 
+import copy
 import datetime
 import re
 
@@ -33,6 +34,22 @@ HASHTAG_PATTERN = (
     '(%(HASHTAG_TEXT)s)' % locals())
 HASHTAG = re.compile(HASHTAG_PATTERN, flags=re.I)
 
+# Like HASHTAG, but without the nested quantifiers that make the regex
+# engine backtrack. Starting with the hash sign lets the engine skip
+# quickly to the candidates. Words without letters are filtered later.
+HASHTAG_CANDIDATE = re.compile(
+    r'(?:#|\uFF03)(?<![%(ALPHA_NUMERIC)s&#].)(?!%(HASHTAG_EXCLUDES)s)(%(ALPHA_NUMERIC)s+)' % locals(),
+    flags=re.I)
+HASHTAG_ALPHA = re.compile(ALPHA, flags=re.I)
+
+
+def find_hashtags(text):
+    '''
+    Return the same tags as [tag for _, _, tag in HASHTAG.findall(text)],
+    but in linear time.
+    '''
+    return [tag for tag in HASHTAG_CANDIDATE.findall(text) if HASHTAG_ALPHA.search(tag)]
+
 
 def escape_tag(tag):
     return tag.lower().replace(' ', '_')
@@ -42,11 +59,13 @@ def convert_category_to_hashtag(category):
     return '#{}'.format(escape_tag(category))
 
 
+# Strip all ASCII punctuation except for #, $, %, @ and '.
+INDEXED_WORD_STRIP_CHARS = '.|-!"&/()=?*+~_:;,<>^°`{}[]\\'
+
+
 def get_indexed_words(text):
     words = text.split()
-
-    # Strip all ASCII punctuation except for #, $, %, @ and '.
-    words = [w.strip('.|-!"&/()=?*+~_:;,<>^°`{}[]\\') for w in words]
+    words = [w.strip(INDEXED_WORD_STRIP_CHARS) for w in words]
     return [word for word in words if word]
 
 
@@ -103,6 +122,13 @@ class Day:
         self.month = month
         self.date = datetime.date(month.year_number, month.month_number, day_number)
 
+        # Small values computed from the content. They are valid as long as
+        # the text is the cached text object and the setters haven't been
+        # used. Word lists are not cached, since keeping them for all days
+        # would take more memory than the journal itself.
+        self._cache = {}
+        self._cache_text = None
+
         # Turn all entries of old "Tags" categories into tags without entries.
         # Apparently, "Tags" may map to None, so explicitly convert to dict.
         old_tags = day_content.pop('Tags', None) or {}
@@ -133,8 +159,20 @@ class Day:
     def _set_text(self, text):
         assert 'text' in self.content
         self.content['text'] = text
+        self._cache.clear()
     text = property(_get_text, _set_text)
 
+    def _get_cached(self, key, compute):
+        text = self.text
+        if self._cache_text is not text:
+            self._cache.clear()
+            self._cache_text = text
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute()
+            return value
+
     @property
     def has_text(self):
         return bool(self.text.strip())
@@ -148,6 +186,7 @@ class Day:
             self.content[category][entry] = None
         else:
             self.content[category] = {entry: None}
+        self._cache.clear()
 
     def merge(self, same_day):
         assert self.date == same_day.date
@@ -170,14 +209,30 @@ class Day:
             for entry in entries:
                 self.add_category_entry(category, entry)
 
+    def get_content_copy(self):
+        '''
+        Return a copy of the content that later edits won't change.
+
+        The copy is reused until the day is edited or forget_content_copy()
+        is called, so callers must not modify it.
+        '''
+        return self._get_cached('content', lambda: copy.deepcopy(self.content))
+
+    def forget_content_copy(self):
+        '''
+        Drop the copy made by get_content_copy() to save memory.
+        '''
+        self._cache.pop('content', None)
+
     @property
     def hashtags(self):
         # The same tag can occur multiple times.
-        return [hashtag.lower() for _, _hash, hashtag in HASHTAG.findall(self.text)]
+        return list(self._get_cached('hashtags', lambda: tuple(
+            hashtag.lower() for hashtag in find_hashtags(self.text))))
 
     @property
     def categories(self):
-        return list(self.get_category_content_pairs().keys())
+        return [category for category, _ in self._get_category_content_tuples()]
 
     def get_entries(self, category):
         return sorted((self.content.get(category) or {}).keys())
@@ -186,23 +241,30 @@ class Day:
         '''
         Returns a dict of (category: content_in_category_as_list) pairs.
         '''
+        return {
+            category: list(content) for category, content in self._get_category_content_tuples()}
+
+    def _get_category_content_tuples(self):
+        return self._get_cached('pairs', self._compute_category_content_tuples)
+
+    def _compute_category_content_tuples(self):
         pairs = {}
         for category, content in self.content.items():
             if category == 'text':
                 pass
             elif content is None:
-                pairs[category] = []
+                pairs[category] = ()
             else:
-                pairs[category] = list(content.keys())
+                pairs[category] = tuple(content.keys())
         # Include hashtags
         for tag in self.hashtags:
-            pairs[tag] = []
-        return pairs
+            pairs[tag] = ()
+        return tuple(pairs.items())
 
     def get_words(self, with_special_chars=False):
         categories_text = ' '.join(
-            ' '.join([category] + content)
-            for category, content in self.get_category_content_pairs().items())
+            ' '.join((category,) + content)
+            for category, content in self._get_category_content_tuples())
 
         all_text = self.text + ' ' + categories_text
         words = all_text.split()
@@ -230,7 +292,8 @@ class Day:
         return words
 
     def get_number_of_words(self):
-        return len(self.get_words(with_special_chars=True))
+        return self._get_cached(
+            'number_of_words', lambda: len(self.get_words(with_special_chars=True)))
 
     def search(self, text, tags):
         """
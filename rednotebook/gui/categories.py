@@ -47,6 +47,11 @@ class CategoriesTreeView:
         # create the TreeView using tree_store
         self.tree_view.set_model(self.tree_store)
 
+        # Whether the tags may have changed since the day was shown or saved.
+        self.modified = False
+        for signal in ['row-changed', 'row-deleted', 'row-inserted']:
+            self.tree_store.connect(signal, self._on_tree_store_changed)
+
         # create the TreeViewColumn to display the data
         self.tvcolumn = Gtk.TreeViewColumn()
         label = Gtk.Label()
@@ -165,6 +170,9 @@ class CategoriesTreeView:
             if value is not None:
                 self.add_element(new_child, value)
 
+    def _on_tree_store_changed(self, *args):
+        self.modified = True
+
     def set_day_content(self, day):
         # We want to order the categories ascendingly
         sorted_keys = sorted(day.content.keys(), key=lambda x: x.lower())
@@ -18,9 +18,11 @@
 # -----------------------------------------------------------------------
 
 from collections import defaultdict
+import heapq
 import locale
 import logging
 import re
+import threading
 
 from gi.repository import Gtk
 from gi.repository import GObject
@@ -30,6 +32,8 @@ from rednotebook import data
 
 
 CLOUD_WORDS = 30
+# Number of related tags and months shown in the tag details.
+TAG_DETAILS_ENTRIES = 12
 
 CLOUD_CSS = """\
 <style type="text/css">
@@ -49,6 +53,11 @@ CLOUD_CSS = """\
 """
 
 
+# Patterns without special characters (except escaped punctuation).
+LITERAL = re.compile(r'(?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])*$')
+ESCAPED_CHAR = re.compile(r'\\(.)')
+
+
 def get_regex(word):
     try:
         return re.compile(word + '$', re.I)
@@ -57,10 +66,82 @@ def get_regex(word):
         return re.compile('^$')
 
 
+def get_matcher(words):
+    '''
+    Return a function that checks if a lowercase word fully matches one of
+    the given words, which may be regular expressions.
+
+    Literal words are looked up in a set, all other words are combined
+    into a single regular expression.
+    '''
+    literals = set()
+    patterns = []
+    for word in words:
+        if LITERAL.match(word):
+            literals.add(ESCAPED_CHAR.sub(r'\1', word))
+        else:
+            patterns.append(word)
+
+    regexes = []
+    if patterns:
+        try:
+            regexes = [re.compile('|'.join('(?:%s)$' % pattern for pattern in patterns), re.I)]
+        except Exception:
+            # Find and skip the invalid patterns.
+            regexes = [get_regex(pattern) for pattern in patterns]
+
+    def matches(word):
+        return word in literals or any(regex.match(word) for regex in regexes)
+    return matches
+
+
+class CloudFilter:
+    '''
+    Select the tags and words that are shown in the cloud.
+
+    Instances are not changed after creation except for the memoised
+    decisions, so worker threads can use them.
+    '''
+    def __init__(self, ignore_list, include_list):
+        self.is_ignored = get_matcher(ignore_list)
+        self.is_included = get_matcher(include_list)
+        # Map words to whether they may be shown in the cloud.
+        self.cloud_word_decisions = {}
+
+    def get_tags(self, tag_count_dict):
+        return [(tag, freq) for (tag, freq) in tag_count_dict.items()
+                if not self.is_ignored(tag)]
+
+    def _is_cloud_word(self, word):
+        try:
+            return self.cloud_word_decisions[word]
+        except KeyError:
+            # filter short words and words in ignore_list
+            decision = (
+                (len(word) > 4 or self.is_included(word)) and not self.is_ignored(word))
+            self.cloud_word_decisions[word] = decision
+            return decision
+
+    def get_words(self, word_count_dict):
+        words = ((word, freq) for (word, freq) in word_count_dict.items()
+                 if self._is_cloud_word(word))
+
+        def frequency(word_and_freq):
+            (word, freq) = word_and_freq
+            return freq
+
+        # only take the most frequent words. If there are less words than n,
+        # len(words) words are returned
+        return heapq.nlargest(CLOUD_WORDS, words, key=frequency)
+
+
 class Cloud(browser.HtmlView):
     def __init__(self, journal):
         super().__init__()
         self.journal = journal
+        # Number of the latest update. Results of older updates are dropped.
+        self.generation = 0
+        self.link_dict = []
         self.update_lists()
 
         self.connect('context-menu', self._on_context_menu)
@@ -83,8 +164,7 @@ class Cloud(browser.HtmlView):
 
     def update_regexes(self):
         logging.debug('Start compiling regexes')
-        self.regexes_ignore = [get_regex(word) for word in self.ignore_list]
-        self.regexes_include = [get_regex(word) for word in self.include_list]
+        self.cloud_filter = CloudFilter(self.ignore_list, self.include_list)
         logging.debug('Finished')
 
     def update(self, force_update=False):
@@ -100,37 +180,57 @@ class Cloud(browser.HtmlView):
 
     def get_categories_counter(self):
         counter = defaultdict(int)
-        for day in self.journal.days:
-            for cat in day.categories:
-                counter['#%s' % data.escape_tag(cat)] += 1
+        for cat, count in self.journal.tag_index.get_counts().items():
+            counter['#%s' % data.escape_tag(cat)] += count
         return counter
 
     def _update(self):
         logging.debug('Update the cloud')
         self.journal.save_old_day()
+        self.generation += 1
 
-        # TODO: Avoid using an instance variable here.
-        self.link_index = 0
-
+        # Let the worker thread use copies of the counts, since they
+        # change when the user edits the journal.
+        tags_count_dict = self.get_categories_counter()
+        word_count_dict = dict(self.journal.get_word_count_dict())
+        font = self.journal.config.read('previewFont')
+        thread = threading.Thread(
+            target=self._compute_cloud,
+            args=(self.generation, tags_count_dict, word_count_dict, self.cloud_filter, font))
+        thread.daemon = True
+        thread.start()
+        return False
+
+    def _compute_cloud(self, generation, tags_count_dict, word_count_dict, cloud_filter, font):
+        '''
+        Runs in a worker thread and passes the HTML to the main thread.
+        '''
         def get_word(word_and_freq):
             word, freq = word_and_freq
             return locale.strxfrm(word)
 
-        tags_count_dict = list(self.get_categories_counter().items())
-        self.tags = self._get_tags_for_cloud(tags_count_dict, self.regexes_ignore)
-        self.tags.sort(key=get_word)
+        tags = cloud_filter.get_tags(tags_count_dict)
+        tags.sort(key=get_word)
 
-        word_count_dict = self.journal.get_word_count_dict()
-        self.words = self._get_words_for_cloud(
-            word_count_dict, self.regexes_ignore, self.regexes_include)
-        self.words.sort(key=get_word)
+        if generation != self.generation:
+            return
 
-        self.link_dict = self.tags + self.words
-        html = self.get_clouds(self.words, self.tags)
+        words = cloud_filter.get_words(word_count_dict)
+        words.sort(key=get_word)
+
+        html = self.get_clouds(words, tags, font)
+        GObject.idle_add(self._show_cloud, generation, html, tags + words)
+
+    def _show_cloud(self, generation, html, link_dict):
+        if generation != self.generation:
+            logging.debug('Dropping outdated cloud')
+            return False
+        self.link_dict = link_dict
         self.load_html(html)
         logging.debug('Cloud updated')
+        return False
 
-    def _get_cloud_body(self, cloud_words):
+    def _get_cloud_body(self, cloud_words, first_link_index=0):
         if not cloud_words:
             return ''
         counts = [freq for (word, freq) in cloud_words]
@@ -146,42 +246,20 @@ class Cloud(browser.HtmlView):
 
         html_elements = []
 
-        for word, count in cloud_words:
+        for link_index, (word, count) in enumerate(cloud_words, start=first_link_index):
             font_factor = (count - min_count) / delta_count
             font_size = int(min_font_size + font_factor * font_delta)
 
             # Add some whitespace to separate words
             html_elements.append('<a href="/#search-%s">'
                                  '<span style="font-size:%spx">%s</span></a>&#160;'
-                                 % (self.link_index, font_size, word))
-            self.link_index += 1
+                                 % (link_index, font_size, word))
         return '\n'.join(html_elements)
 
-    def _get_tags_for_cloud(self, tag_count_dict, ignores):
-        return [(tag, freq) for (tag, freq) in tag_count_dict
-                if not any(pattern.match(tag) for pattern in ignores)]
-
-    def _get_words_for_cloud(self, word_count_dict, ignores, includes):
-        # filter short words
-        words = [(word, freq) for (word, freq) in word_count_dict.items()
-                 if (len(word) > 4 or
-                 any(pattern.match(word) for pattern in includes)) and not
-                 # filter words in ignore_list
-                 any(pattern.match(word) for pattern in ignores)]
-
-        def frequency(word_and_freq):
-            (word, freq) = word_and_freq
-            return freq
-
-        # only take the longest words. If there are less words than n,
-        # len(words) words are returned
-        words.sort(key=frequency)
-        return words[-CLOUD_WORDS:]
-
-    def get_clouds(self, word_counter, tag_counter):
+    def get_clouds(self, word_counter, tag_counter, font):
+        # The links are numbered like the entries in link_dict.
         tag_cloud = self._get_cloud_body(tag_counter)
-        word_cloud = self._get_cloud_body(word_counter)
-        font = self.journal.config.read('previewFont')
+        word_cloud = self._get_cloud_body(word_counter, first_link_index=len(tag_counter))
         heading = '<h1>&#160;%s</h1>'
         parts = ['<html><head>', CLOUD_CSS % locals(), '</head>', '<body>']
         if tag_cloud:
@@ -228,10 +306,38 @@ class Cloud(browser.HtmlView):
             ignore_menu_item = browser.WebKit2.ContextMenuItem.new(action)
             menu.append(ignore_menu_item)
 
+        if tag is not None and tag.startswith('#'):
+            action = Gtk.Action.new('details', _('Show details for "%s"') % tag, None, None)
+            action.connect('activate', self.on_tag_details_menu_activate, tag)
+            menu.append(browser.WebKit2.ContextMenuItem.new(action))
+
     def on_ignore_menu_activate(self, menu_item, word):
         word = re.escape(word)
         logging.info('"{}" will be hidden from clouds'.format(word))
         self.ignore_list.append(word)
         self.journal.config.write_list('cloudIgnoreList', self.ignore_list)
-        self.regexes_ignore.append(get_regex(word))
+        self.update_regexes()
         self.update(force_update=True)
+
+    def on_tag_details_menu_activate(self, menu_item, tag):
+        """Show the tags used together with the tag and its monthly usage."""
+        tag_index = self.journal.tag_index
+        lines = [_('Used together with:')]
+        related = tag_index.get_related(tag)[:TAG_DETAILS_ENTRIES]
+        lines.extend('#%s: %d' % pair for pair in related)
+        if not related:
+            lines.append('-')
+        lines.extend(['', _('Days per month:')])
+        lines.extend(
+            '%s: %d' % (month.strftime('%Y-%m'), count)
+            for month, count in tag_index.get_monthly_counts(tag)[-TAG_DETAILS_ENTRIES:])
+
+        dialog = Gtk.MessageDialog(
+            parent=self.journal.frame.main_frame,
+            type=Gtk.MessageType.INFO,
+            flags=Gtk.DialogFlags.MODAL | Gtk.DialogFlags.DESTROY_WITH_PARENT,
+            buttons=Gtk.ButtonsType.CLOSE,
+            message_format=tag)
+        dialog.format_secondary_text('\n'.join(lines))
+        dialog.run()
+        dialog.destroy()
@@ -318,7 +318,7 @@ class MainWindow:
 
     def hide(self):
         self.add_values_to_config()
-        self.journal.save_to_disk()
+        self.journal.save_to_disk(background=True)
         self.main_frame.hide()
 
     def on_main_frame_delete_event(self, widget, event):
@@ -648,10 +648,23 @@ class MainWindow:
 
         self.categories_tree_view.set_day_content(day)
         self.undo_redo_manager.set_stack(new_date)
+        self.set_day_unmodified()
 
     def get_day_text(self):
         return self.day_text_field.get_text()
 
+    def is_day_modified(self):
+        '''
+        Return whether the text or the tags may have changed since the day
+        was shown or saved.
+        '''
+        return (self.day_text_field.day_text_buffer.get_modified() or
+                self.categories_tree_view.modified)
+
+    def set_day_unmodified(self):
+        self.day_text_field.day_text_buffer.set_modified(False)
+        self.categories_tree_view.modified = False
+
     def highlight_text(self, search_text):
         self.html_editor.highlight(search_text)
         self.day_text_field.highlight(search_text)
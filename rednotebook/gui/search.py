@@ -17,21 +17,30 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------
 
+import itertools
 from xml.sax.saxutils import escape
 
 from gi.repository import GObject
 from gi.repository import Gtk
 
 from rednotebook.gui.customwidgets import CustomComboBoxEntry, CustomListView
+from rednotebook.index import SEARCH_BATCH_SIZE
 from rednotebook.util import dates
 
 
+# Milliseconds to wait after a keystroke before searching. The first batch
+# of results should be available much faster than that (see
+# dev/benchmarks/search.py), so results appear while typing.
+SEARCH_DELAY = 250
+
+
 class SearchComboBox(CustomComboBoxEntry):
     def __init__(self, combo_box, main_window):
         CustomComboBoxEntry.__init__(self, combo_box)
 
         self.main_window = main_window
         self.journal = main_window.journal
+        self.search_timeout = None
 
         self.entry.set_icon_from_stock(1, Gtk.STOCK_CLEAR)
         self.entry.connect('icon-press', lambda *args: self.set_active_text(''))
@@ -41,8 +50,25 @@ class SearchComboBox(CustomComboBoxEntry):
 
     def on_entry_changed(self, entry):
         """Called when the entry changes."""
-        if not self.get_active_text():
+        search_text = self.get_active_text()
+        if not search_text:
             self.search('')
+            return
+        # Abort the running query and wait until the user stops typing.
+        self.stop_search_timeout()
+        self.main_window.search_tree_view.stop_search()
+        self.search_timeout = GObject.timeout_add(
+            SEARCH_DELAY, self.on_search_timeout, search_text)
+
+    def on_search_timeout(self, search_text):
+        self.search_timeout = None
+        self.search(search_text)
+        return False
+
+    def stop_search_timeout(self):
+        if self.search_timeout is not None:
+            GObject.source_remove(self.search_timeout)
+            self.search_timeout = None
 
     def on_entry_activated(self, entry):
         """Called when the user hits enter."""
@@ -51,6 +77,7 @@ class SearchComboBox(CustomComboBoxEntry):
         self.search(search_text)
 
     def search(self, search_text):
+        self.stop_search_timeout()
         tags = []
         queries = []
         for part in search_text.split():
@@ -60,15 +87,17 @@ class SearchComboBox(CustomComboBoxEntry):
                 queries.append(part)
 
         search_text = ' '.join(queries)
+        # Highlight phrases and patterns without quotes and asterisks.
+        highlight_text = search_text.replace('"', '').replace('*', '')
 
         # Highlight all occurences in the current day's text
-        self.main_window.highlight_text(search_text)
+        self.main_window.highlight_text(highlight_text)
 
         # Scroll to query.
-        if search_text:
+        if highlight_text:
             GObject.idle_add(
                 self.main_window.day_text_field.scroll_to_text,
-                search_text)
+                highlight_text)
 
         self.main_window.search_tree_view.update_data(search_text, tags)
 
@@ -80,10 +109,13 @@ class SearchTreeView(CustomListView):
         self.journal = self.main_window.journal
         self.always_show_results = always_show_results
         self.tree_store = self.get_model()
+        self.search_source = None
 
         self.connect('cursor_changed', self.on_cursor_changed)
 
     def update_data(self, search_text, tags):
+        # Abort the search for the previous query.
+        self.stop_search()
         self.tree_store.clear()
 
         if not self.always_show_results and not tags and not search_text:
@@ -94,11 +126,30 @@ class SearchTreeView(CustomListView):
         self.main_window.cloud.hide()
         self.main_window.search_scroll.show()
 
-        for date_string, entries in self.journal.search(search_text, tags):
+        ranked = bool(self.journal.config.read('rankSearchResults'))
+        results = self.journal.search(search_text, tags, ranked=ranked)
+        # Show the first results immediately and add the rest when idle.
+        if self._add_results(results):
+            self.search_source = GObject.idle_add(self._add_results, results)
+
+    def stop_search(self):
+        if self.search_source is not None:
+            GObject.source_remove(self.search_source)
+            self.search_source = None
+
+    def _add_results(self, results):
+        """Add the next batch of results and return True if there may be more."""
+        added = 0
+        for date_string, entries in itertools.islice(results, SEARCH_BATCH_SIZE):
             for entry in entries:
                 entry = escape(entry)
                 entry = entry.replace('STARTBOLD', '<b>').replace('ENDBOLD', '</b>')
                 self.tree_store.append([date_string, entry])
+            added += 1
+        if added < SEARCH_BATCH_SIZE:
+            self.search_source = None
+            return False
+        return True
 
     def on_cursor_changed(self, treeview):
         """Move to the selected day when user clicks on it"""
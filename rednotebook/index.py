@@ -17,26 +17,718 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------
 
+from array import array
+import bisect
 import collections
+import datetime
+import heapq
+import itertools
+import logging
+import marshal
+import math
+import re
+import sys
+
+from rednotebook import data
+from rednotebook import storage
+
+
+INDEX_FORMAT = 5
+# Parameters of the BM25 ranking function.
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TERM_FREQUENCY = 2 ** 16 - 1
+# Number of days shown for ranked searches.
+RANKED_SEARCH_RESULTS = 100
+# Number of days whose search results are shown at once.
+SEARCH_BATCH_SIZE = 50
+
+QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+NEAR_OPERATOR = re.compile(r'NEAR/(\d+)$')
+# Words with a leading and/or trailing "*" and no other "*".
+PATTERN = re.compile(r'\*[^*]+\*?$|[^*]+\*$')
+PATTERN_STRIP_CHARS = data.INDEXED_WORD_STRIP_CHARS.replace('*', '')
+# Mark word boundaries for the trigrams.
+WORD_START = '\x02'
+WORD_END = '\x03'
+
+# A search term matches a phrase if distance is None. Otherwise, it matches
+# two words that are at most distance words apart.
+Term = collections.namedtuple('Term', ['words', 'distance'])
+
+
+def parse_query(text):
+    '''
+    Split the search text into terms.
+
+    "quoted words" are searched as a phrase and "word1 NEAR/n word2"
+    finds the words in any order with at most n-1 words between them.
+    Single words may start or end with "*" to search for words that
+    end with, start with or contain the given text.
+    '''
+    terms = []
+    near_distance = None
+    for quoted, unquoted in QUERY_PART.findall(text):
+        near_match = NEAR_OPERATOR.match(unquoted)
+        if near_match:
+            if terms and len(terms[-1].words) == 1:
+                near_distance = int(near_match.group(1))
+            continue
+        pattern = unquoted.strip(PATTERN_STRIP_CHARS)
+        if PATTERN.match(pattern):
+            words = [pattern]
+        else:
+            words = data.get_indexed_words(quoted or unquoted)
+        if near_distance is not None and len(words) == 1:
+            terms[-1] = Term(terms[-1].words + words, near_distance)
+        elif quoted and words:
+            terms.append(Term(words, None))
+        else:
+            terms.extend(Term([word], None) for word in words)
+        near_distance = None
+    return terms
+
+
+def _intersect(ordinals1, ordinals2):
+    '''
+    Return the ordinals contained in both sorted arrays.
+
+    We look up the values of the shorter array in the longer one, so
+    this is fast if the lengths differ a lot.
+    '''
+    if len(ordinals1) > len(ordinals2):
+        ordinals1, ordinals2 = ordinals2, ordinals1
+    result = array('I')
+    start = 0
+    for ordinal in ordinals1:
+        start = bisect.bisect_left(ordinals2, ordinal, start)
+        if start == len(ordinals2):
+            break
+        if ordinals2[start] == ordinal:
+            result.append(ordinal)
+    return result
+
+
+def _get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _matches_pattern(word, pattern):
+    text = pattern.strip('*')
+    if not pattern.startswith('*'):
+        return word.startswith(text)
+    if not pattern.endswith('*'):
+        return word.endswith(text)
+    return text in word
+
+
+def _contains(values, value):
+    pos = bisect.bisect_left(values, value)
+    return pos < len(values) and values[pos] == value
+
+
+def _get_positions(tokens, word):
+    positions = []
+    position = -1
+    while True:
+        try:
+            position = tokens.index(word, position + 1)
+        except ValueError:
+            return positions
+        positions.append(position)
+
+
+def _get_span(text, tokens, position):
+    '''
+    Return the offsets of the word at position in get_indexed_words(text).
+    '''
+    word = tokens[position]
+    # The regex matches whole whitespace-separated chunks that are the
+    # word after stripping, so we need the n-th match for the n-th word.
+    occurrence = tokens[:position].count(word)
+    regex = re.compile(r'(?<!\S)[{0}]*({1})[{0}]*(?!\S)'.format(
+        re.escape(data.INDEXED_WORD_STRIP_CHARS), re.escape(word)))
+    match = next(itertools.islice(regex.finditer(text), occurrence, None))
+    return match.span(1)
+
+
+def find_phrase(text, words, distance=None):
+    '''
+    Yield the (start, end) offsets of all occurrences of the phrase in
+    the text.
+
+    If distance is given, words must contain two words and we yield the
+    spans in which they are at most distance words apart.
+
+    Storing the positions of all words would make the index several
+    times larger, so we only look for phrases in the texts of the days
+    that contain all words.
+    '''
+    tokens = data.get_indexed_words(text)
+    lowercase_tokens = [token.lower() for token in tokens]
+    positions = [_get_positions(lowercase_tokens, word.lower()) for word in words]
+    if not all(positions):
+        return
+    for position in positions[0]:
+        if distance is None:
+            if not all(_contains(positions[i], position + i) for i in range(1, len(words))):
+                continue
+            first, last = position, position + len(words) - 1
+        else:
+            pos = bisect.bisect_left(positions[1], position - distance)
+            if pos == len(positions[1]) or positions[1][pos] > position + distance:
+                continue
+            first, last = sorted([position, positions[1][pos]])
+        yield _get_span(text, tokens, first)[0], _get_span(text, tokens, last)[1]
+
+
+def _get_text_result(day, start, end):
+    found_text = day.text[start:end].replace('\n', ' ')
+    return data.get_text_with_dots(day.text, start, end, found_text)
+
+
+def _get_word_search_results(day, word, span, tags):
+    if not span:
+        # The word is a pattern or only occurs in the categories.
+        return day.search(word.strip('*'), tags)[1]
+    return [_get_text_result(day, *span)] + day.search_in_categories(word)
+
+
+def _get_day_search_results(day, terms, tag_words, tags):
+    '''
+    Return the search results for the day or None if a phrase is missing.
+    '''
+    results = []
+    for term in terms:
+        span = next(find_phrase(day.text, term.words, term.distance), None)
+        if len(term.words) == 1:
+            results.extend(_get_word_search_results(day, term.words[0], span, tags))
+        elif span:
+            results.append(_get_text_result(day, *span))
+        else:
+            return None
+    for word in tag_words:
+        results.extend(day.search(word, tags)[1])
+    return results
+
+
+# What the clouds, the tag index and the statistics need to know about a
+# month. The lowercase words of the month are joined by newlines and
+# counts holds their numbers of occurrences. days contains (day number,
+# tags, number of words, number of letters) tuples for the non-empty days.
+MonthSummary = collections.namedtuple('MonthSummary', ['words', 'counts', 'days'])
+
+
+def summarize_month(month):
+    word_counts = collections.Counter()
+    days = []
+    for day_number, day in sorted(month.days.items()):
+        if day.empty:
+            continue
+        word_counts.update(word.lower() for word in day.get_words())
+        days.append((day_number, day.categories, day.get_number_of_words(), len(day.text)))
+    return MonthSummary('\n'.join(word_counts), array('I', word_counts.values()), days)
+
+
+def get_word_counts(summary):
+    '''
+    Return a dictionary mapping the lowercase words of the month to their
+    numbers of occurrences.
+    '''
+    if not summary.words:
+        return {}
+    return dict(zip(summary.words.split('\n'), summary.counts))
+
+
+def _get_month_range(year_number, month_number):
+    start = datetime.date(year_number, month_number, 1)
+    end = (start + datetime.timedelta(days=31)).replace(day=1)
+    return start.toordinal(), end.toordinal()
+
+
+def _array_from_bytes(typecode, array_bytes):
+    values = array(typecode)
+    values.frombytes(array_bytes)
+    return values
 
 
 class Index:
+    '''
+    Map lowercase words to the dates of the days containing them.
+
+    Each posting list is a sorted array of date ordinals.
+    '''
     def __init__(self):
-        self._word_to_dates = collections.defaultdict(set)
+        self._word_to_ordinals = {}
+        # Number of occurrences of the words on the days in _word_to_ordinals.
+        self._word_to_counts = {}
+        # Map date ordinals to the number of indexed words for ranking.
+        self._ordinal_to_length = {}
+        self._total_length = 0
+        # Map trigrams of the indexed words to the words containing them.
+        # It is built when searching for a pattern for the first time.
+        self._trigram_to_words = None
+        # Modification times of the month files the index has been built
+        # from. None marks months whose edits have not been saved yet.
+        self.month_mtimes = {}
+        # Whether the index has changed since it was loaded or saved.
+        self.edited = False
+
+    def _add_trigrams(self, word):
+        if self._trigram_to_words is not None:
+            for trigram in _get_trigrams(WORD_START + word + WORD_END):
+                self._trigram_to_words.setdefault(trigram, set()).add(word)
+
+    def _remove_word(self, word):
+        del self._word_to_ordinals[word]
+        del self._word_to_counts[word]
+        if self._trigram_to_words is not None:
+            for trigram in _get_trigrams(WORD_START + word + WORD_END):
+                words = self._trigram_to_words[trigram]
+                words.discard(word)
+                if not words:
+                    del self._trigram_to_words[trigram]
+
+    def _set_length(self, ordinal, length):
+        self.edited = True
+        self._total_length += length - self._ordinal_to_length.pop(ordinal, 0)
+        if length:
+            self._ordinal_to_length[ordinal] = length
 
     def add(self, date, words):
-        for word in set(word.lower() for word in words):
-            self._word_to_dates[word].add(date)
+        ordinal = date.toordinal()
+        word_counts = collections.Counter(word.lower() for word in words)
+        for word, count in word_counts.items():
+            count = min(count, MAX_TERM_FREQUENCY)
+            ordinals = self._word_to_ordinals.get(word)
+            if ordinals is None:
+                self._word_to_ordinals[word] = array('I', [ordinal])
+                self._word_to_counts[word] = array('H', [count])
+                self._add_trigrams(word)
+                continue
+            counts = self._word_to_counts[word]
+            if ordinals[-1] < ordinal:
+                # Days are usually added in chronological order.
+                ordinals.append(ordinal)
+                counts.append(count)
+                continue
+            pos = bisect.bisect_left(ordinals, ordinal)
+            if pos == len(ordinals) or ordinals[pos] != ordinal:
+                ordinals.insert(pos, ordinal)
+                counts.insert(pos, count)
+            else:
+                counts[pos] = count
+        self._set_length(ordinal, len(words))
 
     def remove(self, date, words):
+        ordinal = date.toordinal()
         for word in set(word.lower() for word in words):
-            self._word_to_dates[word].remove(date)
-            if not self._word_to_dates[word]:
-                del self._word_to_dates[word]
+            # The day may not have been indexed yet.
+            ordinals = self._word_to_ordinals.get(word)
+            if ordinals is None:
+                continue
+            pos = bisect.bisect_left(ordinals, ordinal)
+            if pos < len(ordinals) and ordinals[pos] == ordinal:
+                del ordinals[pos]
+                del self._word_to_counts[word][pos]
+            if not ordinals:
+                self._remove_word(word)
+        self._set_length(ordinal, 0)
+
+    def add_day(self, day):
+        self.add(day.date, day.get_indexed_words())
+
+    def remove_day(self, day):
+        '''
+        Remove the day, which must have the content it was added with.
+        '''
+        self.remove(day.date, day.get_indexed_words())
 
     def find(self, word):
-        # Pass a copy to the caller.
-        return set(self._word_to_dates[word.lower()])
+        return set(map(datetime.date.fromordinal, self._word_to_ordinals.get(word.lower(), [])))
+
+    def expand(self, pattern):
+        '''
+        Return the indexed words matching a pattern like "word*", "*word"
+        or "*word*".
+        '''
+        pattern = pattern.lower()
+        if self._trigram_to_words is None:
+            self._trigram_to_words = {}
+            for word in self._word_to_ordinals:
+                self._add_trigrams(word)
+        text = pattern.strip('*')
+        if not pattern.startswith('*'):
+            text = WORD_START + text
+        if not pattern.endswith('*'):
+            text = text + WORD_END
+        trigrams = sorted(
+            _get_trigrams(text), key=lambda trigram: len(self._trigram_to_words.get(trigram, ())))
+        if trigrams:
+            candidates = self._trigram_to_words.get(trigrams[0], set())
+            for trigram in trigrams[1:]:
+                candidates = candidates & self._trigram_to_words.get(trigram, set())
+        else:
+            # The pattern is too short for using trigrams.
+            candidates = self._word_to_ordinals
+        return sorted(word for word in candidates if _matches_pattern(word, pattern))
+
+    def _find_pattern(self, pattern):
+        words = self.expand(pattern)
+        if len(words) == 1:
+            return self._word_to_ordinals[words[0]]
+        # Short patterns match many words. Start with the most frequent
+        # ones and stop as soon as all days are found.
+        words.sort(key=lambda word: len(self._word_to_ordinals[word]), reverse=True)
+        number_of_days = len(self._ordinal_to_length)
+        ordinals = set()
+        for word in words:
+            ordinals.update(self._word_to_ordinals[word])
+            if len(ordinals) == number_of_days:
+                break
+        return array('I', sorted(ordinals))
+
+    def find_all(self, words):
+        '''
+        Return the sorted dates of the days that contain all words.
+
+        Words may be patterns (see expand()).
+        '''
+        postings = []
+        for word in set(word.lower() for word in words):
+            if PATTERN.match(word):
+                ordinals = self._find_pattern(word)
+            else:
+                ordinals = self._word_to_ordinals.get(word)
+            if not ordinals:
+                return []
+            postings.append(ordinals)
+        if not postings:
+            return []
+        # Start with the rarest words to keep the intermediate results small.
+        postings.sort(key=len)
+        ordinals = postings[0]
+        for other_ordinals in postings[1:]:
+            ordinals = _intersect(ordinals, other_ordinals)
+        return [datetime.date.fromordinal(ordinal) for ordinal in ordinals]
+
+    def _get_count(self, word, ordinal):
+        ordinals = self._word_to_ordinals.get(word)
+        if ordinals is None:
+            return 0
+        pos = bisect.bisect_left(ordinals, ordinal)
+        if pos < len(ordinals) and ordinals[pos] == ordinal:
+            return self._word_to_counts[word][pos]
+        return 0
+
+    def rank(self, dates, words):
+        '''
+        Yield the dates ordered by the BM25 scores of their days for the
+        given words, best matches first. Patterns are not scored.
+
+        The dates are ordered with a heap, so getting the first k dates
+        only needs O(n + k log n) time.
+        '''
+        number_of_days = len(self._ordinal_to_length)
+        average_length = self._total_length / number_of_days if number_of_days else 1
+        word_to_idf = {}
+        for word in set(word.lower() for word in words):
+            if word in self._word_to_ordinals:
+                day_frequency = len(self._word_to_ordinals[word])
+                word_to_idf[word] = math.log(
+                    (number_of_days - day_frequency + 0.5) / (day_frequency + 0.5) + 1)
+
+        def get_score(ordinal):
+            length = self._ordinal_to_length.get(ordinal, 0)
+            normalization = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            score = 0
+            for word, idf in word_to_idf.items():
+                count = self._get_count(word, ordinal)
+                score += idf * count * (BM25_K1 + 1) / (count + normalization)
+            return score
+
+        # Prefer newer days if the scores are equal.
+        heap = [(-get_score(date.toordinal()), -date.toordinal(), date) for date in dates]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    def search(self, get_day, text, tags, ranked=False):
+        '''
+        Generate (date string, results) pairs for the matching days.
+
+        get_day(date) returns the day for a date. By default all days are
+        returned, newest first. If ranked is True, only the
+        RANKED_SEARCH_RESULTS days with the highest BM25 scores are
+        returned, best matches first.
+        '''
+        terms = parse_query(text)
+        tag_words = ['#{}'.format(tag) for tag in tags]
+        words = list(itertools.chain.from_iterable(term.words for term in terms)) + tag_words
+
+        if not words:
+            return
+
+        found_dates = self.find_all(words)
+        if ranked:
+            found_dates = self.rank(found_dates, words)
+        else:
+            found_dates = reversed(found_dates)
+
+        found_days = 0
+        for date in found_dates:
+            day = get_day(date)
+            results = _get_day_search_results(day, terms, tag_words, tags)
+            if results is None:
+                continue
+            yield str(day), results
+            found_days += 1
+            if ranked and found_days == RANKED_SEARCH_RESULTS:
+                return
+
+    def remove_month(self, year_number, month_number):
+        start, end = _get_month_range(year_number, month_number)
+        for word, ordinals in list(self._word_to_ordinals.items()):
+            month_slice = slice(bisect.bisect_left(ordinals, start), bisect.bisect_left(ordinals, end))
+            del ordinals[month_slice]
+            del self._word_to_counts[word][month_slice]
+            if not ordinals:
+                self._remove_word(word)
+        for ordinal in [o for o in self._ordinal_to_length if start <= o < end]:
+            self._set_length(ordinal, 0)
+
+    def clear(self):
+        self._word_to_ordinals.clear()
+        self._word_to_counts.clear()
+        self._ordinal_to_length.clear()
+        self._total_length = 0
+        self._trigram_to_words = None
+        self.month_mtimes.clear()
+        self.edited = False
+
+    def save(self, path):
+        word_to_bytes = {
+            word: (ordinals.tobytes(), self._word_to_counts[word].tobytes())
+            for word, ordinals in self._word_to_ordinals.items()}
+        storage.write_cache_file(path, self._get_file_key(), (
+            word_to_bytes, self._ordinal_to_length, self.month_mtimes))
+        self.edited = False
+
+    def load(self, path):
+        '''
+        Replace the index by the one saved at path.
+
+        If the file is missing or invalid, the index is empty afterwards.
+        '''
+        self.clear()
+        saved_index = storage.read_cache_file(path, self._get_file_key())
+        if saved_index is None:
+            logging.info('No valid search index found at %s' % path)
+            return
+        word_to_bytes, ordinal_to_length, self.month_mtimes = saved_index
+        for word, (ordinals_bytes, counts_bytes) in word_to_bytes.items():
+            self._word_to_ordinals[word] = _array_from_bytes('I', ordinals_bytes)
+            self._word_to_counts[word] = _array_from_bytes('H', counts_bytes)
+        for ordinal, length in ordinal_to_length.items():
+            self._set_length(ordinal, length)
+        self.edited = False
+
+    @staticmethod
+    def _get_file_key():
+        # The arrays are stored in the machine's byte order.
+        return ('search-index', INDEX_FORMAT, marshal.version, sys.byteorder,
+                array('I').itemsize, array('H').itemsize)
+
+
+class MonthSummaries:
+    '''
+    Store the summaries of the months (see summarize_month()) together
+    with the modification times of the month files they were made from.
+
+    Saving them lets us show the clouds, tags and statistics without
+    loading the months.
+    '''
+    def __init__(self):
+        # Map year-month values to (mtime, summary) pairs.
+        self._summaries = {}
+        # Whether the summaries have changed since they were loaded or saved.
+        self.edited = False
+
+    def get(self, year_and_month, mtime):
+        '''
+        Return the summary of the month or None if there is none for the
+        month file with the given modification time.
+        '''
+        mtime_and_summary = self._summaries.get(year_and_month)
+        if mtime is None or mtime_and_summary is None or mtime_and_summary[0] != mtime:
+            return None
+        return mtime_and_summary[1]
+
+    def set(self, year_and_month, mtime, summary):
+        self._summaries[year_and_month] = (mtime, summary)
+        self.edited = True
+
+    def remove(self, year_and_month):
+        if self._summaries.pop(year_and_month, None) is not None:
+            self.edited = True
 
     def clear(self):
-        self._word_to_dates.clear()
+        self._summaries.clear()
+        self.edited = False
+
+    def save(self, path):
+        storage.write_cache_file(path, self._get_file_key(), {
+            year_and_month: (mtime, summary.words, summary.counts.tobytes(), summary.days)
+            for year_and_month, (mtime, summary) in self._summaries.items()})
+        self.edited = False
+
+    def load(self, path):
+        '''
+        Replace the summaries by the ones saved at path.
+        '''
+        self.clear()
+        saved_summaries = storage.read_cache_file(path, self._get_file_key())
+        if saved_summaries is None:
+            logging.info('No valid month summaries found at %s' % path)
+            return
+        for year_and_month, (mtime, words, counts_bytes, days) in saved_summaries.items():
+            self._summaries[year_and_month] = (
+                mtime, MonthSummary(words, _array_from_bytes('I', counts_bytes), days))
+
+    def __iter__(self):
+        return iter(list(self._summaries))
+
+    @staticmethod
+    def _get_file_key():
+        # The arrays are stored in the machine's byte order.
+        return ('month-summaries', INDEX_FORMAT, marshal.version, sys.byteorder,
+                array('I').itemsize)
+
+
+class TagIndex:
+    '''
+    Count the number of days on which each tag occurs.
+
+    Tags are the days' categories, including their hashtags. For the tag
+    statistics, tags are also identified by their escaped names (like in
+    "#my_tag"). For these names, we store the sorted date ordinals of the
+    days and how often they occur together with other tags.
+    '''
+    def __init__(self):
+        self._tag_to_count = collections.Counter()
+        self._name_to_ordinals = {}
+        # Symmetric co-occurrence matrix: name -> Counter(other name -> days).
+        self._name_to_related = {}
+
+    @staticmethod
+    def _get_name(tag):
+        return data.escape_tag(tag.lstrip('#'))
+
+    @staticmethod
+    def _get_names(tags):
+        return sorted(set(data.escape_tag(tag) for tag in tags))
+
+    def add_day(self, day):
+        self.add(day.date, day.categories)
+
+    def remove_day(self, day):
+        '''
+        Remove the day, which must have the content it was added with.
+        '''
+        self.remove(day.date, day.categories)
+
+    def add(self, date, tags):
+        self._tag_to_count.update(set(tags))
+        ordinal = date.toordinal()
+        names = self._get_names(tags)
+        for name in names:
+            ordinals = self._name_to_ordinals.setdefault(name, array('I'))
+            pos = bisect.bisect_left(ordinals, ordinal)
+            if pos == len(ordinals) or ordinals[pos] != ordinal:
+                ordinals.insert(pos, ordinal)
+        for name1, name2 in itertools.combinations(names, 2):
+            self._name_to_related.setdefault(name1, collections.Counter())[name2] += 1
+            self._name_to_related.setdefault(name2, collections.Counter())[name1] += 1
+
+    def remove(self, date, tags):
+        for tag in set(tags):
+            self._tag_to_count[tag] -= 1
+            if self._tag_to_count[tag] <= 0:
+                del self._tag_to_count[tag]
+        ordinal = date.toordinal()
+        names = self._get_names(tags)
+        for name in names:
+            ordinals = self._name_to_ordinals.get(name)
+            if ordinals is None:
+                continue
+            pos = bisect.bisect_left(ordinals, ordinal)
+            if pos < len(ordinals) and ordinals[pos] == ordinal:
+                del ordinals[pos]
+            if not ordinals:
+                del self._name_to_ordinals[name]
+        for name1, name2 in itertools.permutations(names, 2):
+            related = self._name_to_related.get(name1)
+            if related is None or name2 not in related:
+                continue
+            related[name2] -= 1
+            if related[name2] <= 0:
+                del related[name2]
+            if not related:
+                del self._name_to_related[name1]
+
+    def clear(self):
+        self._tag_to_count.clear()
+        self._name_to_ordinals.clear()
+        self._name_to_related.clear()
+
+    def get_counts(self):
+        '''
+        Return a dictionary mapping the tags to their number of days.
+        '''
+        return self._tag_to_count
+
+    def get_dates(self, name):
+        '''
+        Return the sorted dates of the days with the tag name. The name
+        may start with "#".
+        '''
+        return [datetime.date.fromordinal(ordinal)
+                for ordinal in self._name_to_ordinals.get(self._get_name(name), [])]
+
+    def get_monthly_counts(self, name):
+        '''
+        Return (first day of month, number of days) pairs for the months in
+        which the tag name is used, ordered by date.
+        '''
+        counts = []
+        for date in self.get_dates(name):
+            month = date.replace(day=1)
+            if counts and counts[-1][0] == month:
+                counts[-1][1] += 1
+            else:
+                counts.append([month, 1])
+        return [tuple(pair) for pair in counts]
+
+    def get_related(self, name):
+        '''
+        Return (tag name, number of days) pairs for the tags that occur
+        together with the tag name, most frequent first.
+        '''
+        related = self._name_to_related.get(self._get_name(name), {})
+        return sorted(related.items(), key=lambda pair: (-pair[1], pair[0]))
+
+    def get_cooccurrences(self):
+        '''
+        Return a dictionary mapping pairs of tag names to the number of days
+        on which both occur. Each pair is sorted and only included once.
+        '''
+        return {
+            (name1, name2): count
+            for name1, related in self._name_to_related.items()
+            for name2, count in related.items() if name1 < name2}
+
+    def __iter__(self):
+        return iter(self._tag_to_count)
+
+    def __len__(self):
+        return len(self._tag_to_count)
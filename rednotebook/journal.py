@@ -17,9 +17,11 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------
 
-from collections import defaultdict
+import bisect
+from collections import Counter
+import contextlib
 import datetime
-import itertools
+import functools
 import locale
 import logging
 import os
@@ -168,6 +170,9 @@ from rednotebook import index
 from rednotebook import storage
 from rednotebook.data import Month
 
+# Number of months loaded and indexed per idle callback in lazy mode.
+INDEX_BATCH_SIZE = 2
+
 
 class Journal:
     def __init__(self):
@@ -185,9 +190,25 @@ class Journal:
 
         self.month = None
         self.date = None
-        self.months = {}
+        self.months = storage.LazyMonths()
+        # Writes the month files without blocking the GUI.
+        self.save_worker = storage.SaveWorker()
 
         self.search_index = index.Index()
+        # Saved word counts, tags and statistics of the months.
+        self.month_summaries = index.MonthSummaries()
+        # Map lowercase words to their number of occurrences for the cloud.
+        self.word_counter = Counter()
+        self.tag_index = index.TagIndex()
+        self.stats = Statistics(self)
+        # Sorted dates of the non-empty days. Computed when first needed.
+        self._dates = None
+        # Generator that indexes the months while the journal is opened.
+        self._indexer = None
+        # Months whose days have been counted by the current indexer.
+        self._counted_months = set()
+        # Months that have to be added to the search index again.
+        self._unindexed_months = set()
 
         # The dir name is the title
         self.title = ''
@@ -202,18 +223,22 @@ class Journal:
 
         self.actual_date = self.get_start_date()
 
+        journal_path = self.get_journal_path()
+        valid_journal_path = self.dirs.is_valid_journal_path(journal_path)
+        # The GUI starts threads, so parse the files before creating it.
+        months = self._load_months_in_parallel(journal_path) if valid_journal_path else None
+
         # Let components check if the MainWindow has been created
         self.frame = None
         self.frame = MainWindow(self)
 
-        journal_path = self.get_journal_path()
-        if not self.dirs.is_valid_journal_path(journal_path):
+        if not valid_journal_path:
             logging.error('Invalid directory: %s. Using default journal.' % journal_path)
             self.show_message(_('You cannot use this directory for your journal:') +
                               ' %s' % journal_path + '. ' + _('Opening default journal.'),
                               error=True)
             journal_path = self.dirs.default_data_dir
-        self.open_journal(journal_path)
+        self.open_journal(journal_path, months)
 
         self.archiver = backup.Archiver(self)
         GObject.idle_add(self.archiver.check_last_backup_date)
@@ -223,7 +248,7 @@ class Journal:
             utils.check_new_version(self, info.version, startup=True)
 
         # Automatically save the content after a period of time
-        GObject.timeout_add_seconds(600, self.save_to_disk)
+        GObject.timeout_add_seconds(600, functools.partial(self.save_to_disk, background=True))
 
     def get_journal_path(self):
         '''
@@ -292,7 +317,15 @@ class Journal:
         options['font'] = self.config.read('previewFont')
         return markup.convert(text, target, self.dirs.data_dir, headers=headers, options=options)
 
-    def save_to_disk(self, exit_imminent=False, changing_journal=False, saveas=False):
+    def save_to_disk(self, exit_imminent=False, changing_journal=False, saveas=False,
+                     background=False):
+        '''
+        Save the edited months.
+
+        If background is True, write the files in the save worker's thread
+        and report the results when they are available. Otherwise wait
+        until all files have been written.
+        '''
         self.save_old_day()
 
         try:
@@ -302,33 +335,77 @@ class Journal:
             self.frame.show_save_error_dialog(exit_imminent)
             return True
 
-        try:
-            something_saved = storage.save_months_to_disk(
-                self.months, self.dirs.data_dir, exit_imminent, saveas)
-        except (IOError, OSError) as err:
-            logging.error('Saving month files failed: {}'.format(err))
-            self.frame.show_save_error_dialog(exit_imminent)
-            something_saved = None
-
-        if something_saved:
-            self.show_message(_('The content has been saved to %s') % self.dirs.data_dir, error=False)
-            logging.info('The content has been saved to %r' % self.dirs.data_dir)
-        elif something_saved is None:
-            # Don't display this as an error, because we already show a dialog.
-            self.show_message(_('The journal could not be saved'), error=False)
+        if not background:
+            # Let this save retry the months of failed background saves.
+            self.save_worker.wait()
+            self.save_worker.get_results()
+
+        # Months that haven't been loaded can't have been edited.
+        months = self.months if saveas else self.months.loaded
+        if background:
+            self.save_worker.save(
+                months, self.dirs.data_dir, saveas, on_done=self._on_save_worker_done)
         else:
-            self.show_message(_('Nothing to save'), error=False)
+            self.save_worker.save(months, self.dirs.data_dir, saveas)
+            self.save_worker.wait()
+            self._show_save_results(exit_imminent, changing_journal)
+            if exit_imminent or changing_journal:
+                # Writing the indexes blocks the GUI, so we only do it when
+                # closing the journal. After a crash, the months changed
+                # since the last write are reindexed.
+                self._save_search_index()
+                self._save_month_summaries()
 
         self.config.save_to_disk()
 
-        if not (exit_imminent or changing_journal) and something_saved:
-            # Update cloud
-            self.frame.cloud.update(force_update=True)
-
         # tell gobject to keep saving the content in regular intervals
         return True
 
-    def open_journal(self, data_dir):
+    def _on_save_worker_done(self):
+        # Called in the save worker's thread.
+        GObject.idle_add(self._show_save_results)
+
+    def _show_save_results(self, exit_imminent=False, changing_journal=False):
+        for result in self.save_worker.get_results():
+            if result.error:
+                logging.error('Saving month files failed: {}'.format(result.error))
+                self.frame.show_save_error_dialog(exit_imminent)
+                # Don't display this as an error, because we already show a dialog.
+                self.show_message(_('The journal could not be saved'), error=False)
+            elif result.saved:
+                self.show_message(
+                    _('The content has been saved to %s') % result.journal_dir, error=False)
+                logging.info('The content has been saved to %r (%d months, %d bytes)' % (
+                    result.journal_dir, len(result.saved), result.size))
+                if not (exit_imminent or changing_journal):
+                    # Update cloud
+                    self.frame.cloud.update(force_update=True)
+            else:
+                self.show_message(_('Nothing to save'), error=False)
+
+        # Don't call this method again if it runs as an idle callback.
+        return False
+
+    def _load_months_in_parallel(self, data_dir):
+        '''
+        Load all months with worker processes if parallel loading is enabled.
+
+        Return None if the months should be loaded by open_journal().
+        Forking is only safe before other threads have been started, so
+        this must run before the GUI is created.
+        '''
+        parallel = self.config.read('parallelLoading') and not self.config.read('lazyLoading')
+        if not parallel or not os.path.isdir(data_dir):
+            return None
+        months = storage.LazyMonths(data_dir, use_cache=True)
+        months.load_all(parallel=True)
+        return months
+
+    def open_journal(self, data_dir, months=None):
+        '''
+        Open the journal in data_dir. If given, months are the already
+        loaded months of the journal.
+        '''
         if not os.path.exists(data_dir):
             logging.warning('The dir %s does not exist. Select a different dir.'
                             % data_dir)
@@ -344,28 +421,39 @@ class Journal:
         self.months.clear()
         self.frame.search_box.clear()
         self.search_index.clear()
-
-        self.months = storage.load_all_months_from_disk(data_dir)
+        self.month_summaries.load(storage.get_month_summaries_file(data_dir))
+        self.word_counter.clear()
+        self.tag_index.clear()
+        self.stats.clear()
+        self._dates = None
+
+        # Saves that were interrupted by a crash leave temporary files behind.
+        storage.remove_temporary_files(data_dir)
+        lazy = bool(self.config.read('lazyLoading'))
+        if months is None:
+            months = storage.LazyMonths(data_dir, use_cache=True)
+            if not lazy:
+                months.load_all()
+        months.on_error = self._show_unreadable_month
+        self.months = months
 
         # Nothing to save before first day change
         self.load_day(self.actual_date)
 
-        if self.is_first_start and not os.listdir(data_dir) and not self.days:
+        if self.is_first_start and not os.listdir(data_dir) and not self.get_dates():
             self.add_instruction_content()
 
-        # We can't use self.days here since it uses self.save_old_day.
-        for month in self.months.values():
-            for day in month.days.values():
-                self.search_index.add(day.date, day.get_indexed_words())
-
-        self.stats = Statistics(self)
-
-        self.frame.cloud.update(force_update=True)
-
-        self.frame.categories_tree_view.categories = self.categories
-        # Add auto-completion for tag search
-        self.frame.search_box.set_entries(
-            ['#%s' % data.escape_tag(tag) for tag in self.categories])
+        self._counted_months.clear()
+        self._unindexed_months.clear()
+        indexer = self._index_months()
+        self._indexer = indexer
+        if lazy:
+            # Show the first day before loading the other months.
+            GObject.idle_add(self._index_next_months, indexer)
+        else:
+            for _ in indexer:
+                pass
+            self._show_index()
 
         self.title = filesystem.get_journal_title(data_dir)
 
@@ -379,6 +467,139 @@ class Journal:
             rel_data_dir = filesystem.get_relative_path(self.dirs.app_dir, data_dir)
             self.config['dataDir'] = rel_data_dir
 
+    def _show_unreadable_month(self, path):
+        self.show_message(
+            _('The file %s could not be read. Its days are shown as empty.') % path,
+            error=True)
+
+    def _index_next_months(self, indexer):
+        '''
+        Idle callback that loads and indexes a few months at a time.
+        '''
+        if indexer is not self._indexer:
+            # Another journal has been opened in the meantime.
+            return False
+        for _ in range(INDEX_BATCH_SIZE):
+            if next(indexer, None) is None:
+                self._show_index()
+                return False
+        return True
+
+    def _show_index(self):
+        '''
+        Show the tags and clouds once all months have been indexed.
+        '''
+        self._indexer = None
+        self.frame.cloud.update(force_update=True)
+
+        categories = self.categories
+        self.frame.categories_tree_view.categories = categories
+        # Add auto-completion for tag search
+        self.frame.search_box.set_entries(
+            ['#%s' % data.escape_tag(tag) for tag in categories])
+
+    def _index_months(self):
+        '''
+        Update the search index and compute the word counts, tags and
+        statistics one month at a time.
+
+        Unloaded months are only loaded if they have to be reindexed or
+        have no up-to-date summary. Yield after each loaded month, so the
+        GUI stays responsive in lazy mode.
+        '''
+        mtimes = self._prepare_search_index()
+        self.word_counter.clear()
+        self.tag_index.clear()
+        self.stats.clear()
+        while True:
+            # Months created while indexing are counted, too.
+            pending = sorted(set(self.months) - self._counted_months)
+            if not pending:
+                return
+            year_and_month = pending[0]
+            reindex = year_and_month in self._unindexed_months
+            summary = None
+            if not reindex and year_and_month not in self.months.loaded:
+                summary = self.month_summaries.get(year_and_month, mtimes[year_and_month])
+            if summary is None:
+                month = self.months[year_and_month]
+                if reindex:
+                    # We can't use self.days here since it uses self.save_old_day.
+                    for day in month.days.values():
+                        self.search_index.add_day(day)
+                    self.search_index.month_mtimes[year_and_month] = mtimes[year_and_month]
+                    self._unindexed_months.discard(year_and_month)
+                summary = index.summarize_month(month)
+                if not month.edited:
+                    self.month_summaries.set(year_and_month, month.mtime, summary)
+            self._add_month_summary(year_and_month, summary)
+            self._counted_months.add(year_and_month)
+            if year_and_month in self.months.loaded:
+                yield year_and_month
+
+    def _add_month_summary(self, year_and_month, summary):
+        year_number, month_number = map(int, year_and_month.split('-'))
+        self.word_counter.update(index.get_word_counts(summary))
+        for day_number, tags, words, chars in summary.days:
+            date = datetime.date(year_number, month_number, day_number)
+            self.tag_index.add(date, tags)
+            self.stats.add(date, words, chars, len(tags))
+
+    def _prepare_search_index(self):
+        '''
+        Load the saved search index and remove all months whose files
+        have changed since the index was saved. Remember the changed
+        months in self._unindexed_months and return the current mtimes.
+        '''
+        self.search_index.load(storage.get_search_index_file(self.dirs.data_dir))
+        indexed_mtimes = dict(self.search_index.month_mtimes)
+        mtimes = self.months.get_mtimes()
+        outdated = sorted(
+            year_and_month for year_and_month, mtime in mtimes.items()
+            if mtime is None or indexed_mtimes.get(year_and_month) != mtime)
+        removed = sorted(set(indexed_mtimes) - set(mtimes))
+        if outdated or removed:
+            logging.info('Updating the search index for %d months' % len(outdated + removed))
+        for year_and_month in removed + outdated:
+            year_number, month_number = map(int, year_and_month.split('-'))
+            self.search_index.remove_month(year_number, month_number)
+            self.search_index.month_mtimes.pop(year_and_month, None)
+        self._unindexed_months.update(outdated)
+        return mtimes
+
+    def _update_word_counter(self, old_words, new_words):
+        changes = Counter(word.lower() for word in new_words)
+        changes.subtract(word.lower() for word in old_words)
+        for word, change in changes.items():
+            if not change:
+                continue
+            self.word_counter[word] += change
+            if self.word_counter[word] <= 0:
+                del self.word_counter[word]
+
+    def _save_month_summaries(self):
+        for year_and_month, month in self.months.loaded.items():
+            if month.edited:
+                self.month_summaries.remove(year_and_month)
+            elif self.month_summaries.get(year_and_month, month.mtime) is None:
+                self.month_summaries.set(
+                    year_and_month, month.mtime, index.summarize_month(month))
+        for year_and_month in self.month_summaries:
+            if year_and_month not in self.months:
+                self.month_summaries.remove(year_and_month)
+        if self.month_summaries.edited:
+            self.month_summaries.save(storage.get_month_summaries_file(self.dirs.data_dir))
+
+    def _save_search_index(self):
+        if not self.search_index.edited:
+            return
+        for year_and_month, month in self.months.loaded.items():
+            if year_and_month in self._unindexed_months:
+                # The indexer hasn't reached this month yet.
+                continue
+            self.search_index.month_mtimes[year_and_month] = None if month.edited else month.mtime
+        self.search_index.save(storage.get_search_index_file(self.dirs.data_dir))
+
     def set_frame_title(self):
         parts = ['RedNotebook']
         if self.title != 'data':
@@ -388,8 +609,8 @@ class Journal:
 
     def get_month(self, date):
         '''
-        Returns the corresponding month if it has previously been visited,
-        otherwise a new month is created and returned
+        Returns the corresponding month if it has previously been visited
+        or is stored on disk, otherwise a new month is created and returned
         '''
 
         year_and_month = dates.get_year_and_month_from_date(date)
@@ -405,19 +626,58 @@ class Journal:
 
     def save_old_day(self):
         '''Order is important'''
-        self.search_index.remove(self.day.date, self.day.get_indexed_words())
+        if not self.frame.is_day_modified():
+            return
         old_content = self.day.content
         new_content = self.frame.categories_tree_view.get_day_content()
         new_content['text'] = self.frame.get_day_text()
-        self.day.content = new_content
-        self.search_index.add(self.day.date, self.day.get_indexed_words())
+        self.frame.set_day_unmodified()
 
-        content_changed = (old_content != new_content)
-        if content_changed:
-            self.month.edited = True
+        # Reindexing is expensive, so skip it if the user undid all changes.
+        if old_content == new_content:
+            return
+        with self._updating_day(self.day):
+            self.day.content = new_content
+        self.month.edited = True
 
         self.frame.calendar.set_day_edited(self.date.day, not self.day.empty)
 
+    @contextlib.contextmanager
+    def _updating_day(self, day):
+        '''
+        Update the search index, the word counts, the tags and the
+        statistics for changes to the day.
+        '''
+        # Months that haven't been counted yet are counted by the indexer.
+        counted = self._indexer is None or (
+            dates.get_year_and_month_from_date(day.date) in self._counted_months)
+        self.search_index.remove_day(day)
+        if counted:
+            self.tag_index.remove_day(day)
+            self.stats.remove_day(day)
+            old_words = day.get_words()
+        try:
+            yield
+        finally:
+            # Add the day again even if changing it failed, since later
+            # updates remove it again.
+            self.search_index.add_day(day)
+            if counted:
+                self.tag_index.add_day(day)
+                self.stats.add_day(day)
+                self._update_word_counter(old_words, day.get_words())
+            self._update_dates(day)
+
+    def _update_dates(self, day):
+        if self._dates is None:
+            return
+        pos = bisect.bisect_left(self._dates, day.date)
+        listed = pos < len(self._dates) and self._dates[pos] == day.date
+        if listed and day.empty:
+            del self._dates[pos]
+        elif not listed and not day.empty:
+            self._dates.insert(pos, day.date)
+
     def load_day(self, new_date):
         old_date = self.date
         self.date = new_date
@@ -438,7 +698,8 @@ class Journal:
             date = new_day.date
             month = self.get_month(date)
             old_day = month.get_day(date.day)
-            old_day.merge(new_day)
+            with self._updating_day(old_day):
+                old_day.merge(new_day)
             month.edited = True
 
     @property
@@ -459,16 +720,18 @@ class Journal:
 
     def go_to_next_day(self):
         next_date = self.date + dates.one_day
-        following_edited_days = self.get_days_in_date_range(start_date=next_date)
-        if following_edited_days:
-            next_date = following_edited_days[0].date
+        edited_dates = self.get_dates()
+        pos = bisect.bisect_left(edited_dates, next_date)
+        if pos < len(edited_dates):
+            next_date = edited_dates[pos]
         self.change_date(next_date)
 
     def go_to_prev_day(self):
         prev_date = self.date - dates.one_day
-        previous_edited_days = self.get_days_in_date_range(end_date=prev_date)
-        if previous_edited_days:
-            prev_date = previous_edited_days[-1].date
+        edited_dates = self.get_dates()
+        pos = bisect.bisect_right(edited_dates, prev_date)
+        if pos > 0:
+            prev_date = edited_dates[pos - 1]
         self.change_date(prev_date)
 
     def show_message(self, msg, title=None, error=False):
@@ -487,8 +750,10 @@ class Journal:
 
     @property
     def categories(self):
-        return list(sorted(set(itertools.chain.from_iterable(
-            day.categories for day in self.days)), key=locale.strxfrm))
+        # The day being edited counts too.
+        if self.frame:
+            self.save_old_day()
+        return sorted(self.tag_index, key=locale.strxfrm)
 
     def get_entries(self, category):
         entries = set()
@@ -496,52 +761,59 @@ class Journal:
             entries |= set(day.get_entries(category))
         return sorted(entries)
 
-    def search(self, text, tags):
-        words = data.get_indexed_words(text)
-        words.extend('#{}'.format(tag) for tag in tags)
-
-        if not words:
-            return []
-
-        dates = self.search_index.find(words[0])
-        for word in words[1:]:
-            dates &= self.search_index.find(word)
+    def search(self, text, tags, ranked=False):
+        '''
+        Generate (date string, results) pairs for the matching days.
 
-        results = []
-        for date in sorted(dates, reverse=True):
-            for word in words:
-                results.append(self.get_day(date).search(word, tags))
-        return results
+        See Index.search() for details.
+        '''
+        return self.search_index.search(self.get_day, text, tags, ranked)
 
     def get_word_count_dict(self):
         """
         Return a dictionary mapping the words to their number of appearance.
         """
-        word_dict = defaultdict(int)
-        for day in self.days:
-            words = day.get_words()
-            for word in words:
-                word_dict[word.lower()] += 1
-        return word_dict
+        # The day being edited counts too.
+        if self.frame:
+            self.save_old_day()
+        return self.word_counter
 
-    @property
-    def days(self):
+    def get_dates(self):
         '''
-        Returns all edited days ordered by their date
+        Returns the sorted dates of all edited days
+
+        The list is updated when days change and must not be modified.
         '''
         # The day being edited counts too
         if self.frame:
             self.save_old_day()
 
-        days = []
-        for month in self.months.values():
-            # Filter out days without content.
-            days_in_month = [day for day in month.days.values() if not day.empty]
-            days.extend(days_in_month)
+        if self._dates is None:
+            edited_dates = []
+            mtimes = self.months.get_mtimes()
+            for year_and_month in self.months:
+                summary = None
+                if year_and_month not in self.months.loaded:
+                    # Avoid loading the month if we know its days.
+                    summary = self.month_summaries.get(year_and_month, mtimes[year_and_month])
+                if summary is None:
+                    month = self.months[year_and_month]
+                    edited_dates.extend(
+                        day.date for day in month.days.values() if not day.empty)
+                else:
+                    year_number, month_number = map(int, year_and_month.split('-'))
+                    edited_dates.extend(
+                        datetime.date(year_number, month_number, day_number)
+                        for day_number, _, _, _ in summary.days)
+            self._dates = sorted(edited_dates)
+        return self._dates
 
-        # Sort days
-        days = sorted(days, key=lambda day: day.date)
-        return days
+    @property
+    def days(self):
+        '''
+        Returns all edited days ordered by their date
+        '''
+        return [self.get_day(date) for date in self.get_dates()]
 
     def get_days_in_date_range(self, start_date=None, end_date=None):
         if not start_date:
@@ -552,15 +824,10 @@ class Journal:
         start_date, end_date = sorted([start_date, end_date])
         assert start_date <= end_date
 
-        days_in_date_range = []
-        for day in self.days:
-            if day.date < start_date:
-                continue
-            elif start_date <= day.date <= end_date:
-                days_in_date_range.append(day)
-            elif day.date > end_date:
-                break
-        return days_in_date_range
+        edited_dates = self.get_dates()
+        start = bisect.bisect_left(edited_dates, start_date)
+        end = bisect.bisect_right(edited_dates, end_date)
+        return [self.get_day(date) for date in edited_dates[start:end]]
 
     def add_instruction_content(self):
         self.change_date(datetime.date.today())
@@ -569,7 +836,8 @@ class Journal:
         logging.info('Adding example content on %s' % current_date)
 
         for example_day in info.example_content:
-            self.day.content = example_day
+            with self._updating_day(self.day):
+                self.day.content = example_day
             self.frame.set_date(self.month, self.date, self.day)
             self.go_to_next_day()
 
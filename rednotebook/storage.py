@@ -18,12 +18,21 @@
 # -----------------------------------------------------------------------
 
 import codecs
+import collections
+import collections.abc
+import functools
 import logging
+import marshal
+import multiprocessing
 import os
+import queue
 import re
 import shutil
-import stat
 import sys
+import tempfile
+import threading
+import time
+import zlib
 
 
 try:
@@ -42,6 +51,14 @@ except ImportError:
 from rednotebook.data import Month
 
 
+# Parsed month files are cached in this subdirectory of the journal.
+CACHE_DIR = '.cache'
+CACHE_FORMAT = 1
+# Files modified more recently may change again without changing their
+# mtime, so we don't cache them.
+MIN_CACHE_AGE = 2
+
+
 def format_year_and_month(year, month):
     return '%04d-%02d' % (year, month)
 
@@ -62,19 +79,138 @@ def get_journal_files(data_dir):
             logging.debug('%s is not a valid month filename' % file)
 
 
-def _load_month_from_disk(path, year_number, month_number):
+def is_temporary_file(filename):
+    '''
+    Return True for the temporary files written when saving a month,
+    e.g. 2014-12.x8d3k.new.
+    '''
+    return bool(re.match(r'\d{4}-\d{2}\..+\.new$', filename))
+
+
+def remove_temporary_files(data_dir):
+    '''
+    Remove the temporary files left behind by interrupted saves.
+    '''
+    for file in os.listdir(data_dir):
+        if is_temporary_file(file):
+            path = os.path.join(data_dir, file)
+            logging.info('Removing temporary file %s' % path)
+            try:
+                os.remove(path)
+            except OSError as err:
+                logging.warning('Could not remove %s: %s' % (path, err))
+
+
+def _parse_month_file(path):
+    with codecs.open(path, 'rb', encoding='utf-8') as month_file:
+        document = month_file.read()
+    # Files we wrote can be parsed without PyYAML.
+    month_contents = _load_month(document)
+    if month_contents is None:
+        month_contents = yaml.load(document, Loader=Loader)
+    return month_contents
+
+
+def get_cache_dir(journal_dir):
+    return os.path.join(journal_dir, CACHE_DIR)
+
+
+def get_search_index_file(journal_dir):
+    return os.path.join(get_cache_dir(journal_dir), 'search-index')
+
+
+def get_month_summaries_file(journal_dir):
+    return os.path.join(get_cache_dir(journal_dir), 'month-summaries')
+
+
+def _get_cache_file(path):
+    journal_dir, filename = os.path.split(path)
+    return os.path.join(get_cache_dir(journal_dir), os.path.splitext(filename)[0] + '.cache')
+
+
+def _get_cache_key(path, stat_result):
+    return (CACHE_FORMAT, marshal.version, os.path.abspath(path),
+            stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def read_cache_file(cache_file, key):
+    '''
+    Return the data stored under key or None if there is no valid entry.
+    '''
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_key, checksum, payload = marshal.load(f)
+        if cached_key != key or zlib.crc32(payload) != checksum:
+            return None
+        return marshal.loads(payload)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        logging.debug('Ignoring invalid cache file %s: %s' % (cache_file, err))
+        return None
+
+
+def write_cache_file(cache_file, key, data):
+    try:
+        payload = marshal.dumps(data)
+    except ValueError:
+        # The data contains values that marshal cannot store.
+        return
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        # The temporary file is only readable and writable by the owner.
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump((key, zlib.crc32(payload), payload), f)
+        os.replace(tmp_file, cache_file)
+    except OSError as err:
+        logging.debug('Could not write cache file %s: %s' % (cache_file, err))
+
+
+def _read_month_file(path, use_cache=False):
+    '''
+    Parse the month file at path.
+
+    If use_cache is True, reuse the contents parsed at an earlier start
+    if the file's size and modification time are unchanged. The month
+    file always takes precedence: we fall back to parsing it whenever the
+    cache entry is missing, outdated or corrupt.
+    '''
+    if not use_cache:
+        return _parse_month_file(path)
+
+    stat_result = os.stat(path)
+    key = _get_cache_key(path, stat_result)
+    cache_file = _get_cache_file(path)
+    month_contents = read_cache_file(cache_file, key)
+    if month_contents is None:
+        month_contents = _parse_month_file(path)
+        if time.time() - stat_result.st_mtime > MIN_CACHE_AGE:
+            write_cache_file(cache_file, key, month_contents)
+    return month_contents
+
+
+def _load_month_from_disk(path, year_number, month_number, read_contents=None,
+                          exit_on_error=True):
     '''
     Load the month file at path and return a month object
 
-    If an error occurs, return None
+    If given, read_contents() returns the already parsed file contents.
+    Errors raised by it are handled like errors during parsing.
+
+    If the file can't be read or parsed, exit or return None if
+    exit_on_error is False.
     '''
     try:
         # Try to read the contents of the file.
-        with codecs.open(path, 'rb', encoding='utf-8') as month_file:
-            logging.debug('Loading file "%s"' % path)
-            month_contents = yaml.load(month_file, Loader=Loader)
-            month = Month(year_number, month_number, month_contents, os.path.getmtime(path))
-            return month
+        logging.debug('Loading file "%s"' % path)
+        if read_contents is None:
+            month_contents = _parse_month_file(path)
+        else:
+            month_contents = read_contents()
+        month = Month(year_number, month_number, month_contents, os.path.getmtime(path))
+        return month
     except yaml.YAMLError as exc:
         logging.error('Error in file %s:\n%s' % (path, exc))
     except IOError:
@@ -83,88 +219,565 @@ def _load_month_from_disk(path, year_number, month_number):
     except Exception:
         logging.error('An error occured while reading %s:' % path)
         raise
+    if not exit_on_error:
+        return None
     # If we continued here, the possibly corrupted file would be overwritten.
     sys.exit(1)
 
 
-def load_all_months_from_disk(data_dir):
+def _get_number_of_threads():
+    '''
+    Return the number of threads of this process, including the ones
+    started by native libraries like GTK, or None if it is unknown.
+    '''
+    try:
+        return len(os.listdir('/proc/self/task'))
+    except OSError:
+        return None
+
+
+def _get_process_context():
+    '''
+    Return a multiprocessing context for parsing files in parallel or None.
+
+    Spawned processes would import the main module and thus start a second
+    GUI, so we only parse in parallel where we can fork. Forking is only
+    safe as long as this process has a single thread, since the child
+    processes would inherit locks held by the other threads. We can only
+    check this on Linux, so we don't fork anywhere else.
+    '''
+    if _get_number_of_threads() != 1:
+        return None
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def _load_months(journal_files, parallel=False, use_cache=False):
+    '''
+    Load the given (path, year, month) journal files and yield month objects.
+    '''
+    read_month_file = functools.partial(_read_month_file, use_cache=use_cache)
+    context = _get_process_context() if parallel else None
+    if context is not None and len(journal_files) > 1:
+        logging.debug('Parsing %d files in parallel' % len(journal_files))
+        with context.Pool() as pool:
+            # imap() yields the results in order and reraises errors in this process.
+            results = pool.imap(read_month_file, [path for path, _, _ in journal_files])
+            for path, year_number, month_number in journal_files:
+                yield _load_month_from_disk(
+                    path, year_number, month_number, functools.partial(next, results))
+    else:
+        for path, year_number, month_number in journal_files:
+            yield _load_month_from_disk(
+                path, year_number, month_number, functools.partial(read_month_file, path))
+
+
+def load_all_months_from_disk(data_dir, parallel=False, use_cache=False):
     '''
     Load all months and return a directory mapping year-month values
     to month objects.
+
+    If parallel is True, parse the files in a pool of worker processes.
+    If use_cache is True, keep the parsed contents in CACHE_DIR to skip
+    parsing unchanged files at the next start.
     '''
     months = {}
-
     logging.debug('Starting to load files in dir "%s"' % data_dir)
-    for path, year_number, month_number in get_journal_files(data_dir):
-        month = _load_month_from_disk(path, year_number, month_number)
+    for month in _load_months(list(get_journal_files(data_dir)), parallel, use_cache):
         if month:
-            months[format_year_and_month(year_number, month_number)] = month
-
+            months[format_year_and_month(month.year_number, month.month_number)] = month
     logging.debug('Finished loading files in dir "%s"' % data_dir)
     return months
 
 
-def _save_month_to_disk(month, journal_dir):
+class LazyMonths(collections.abc.MutableMapping):
+    '''
+    Dictionary mapping year-month values to month objects.
+
+    Only the names of the month files are read initially. Each month is
+    loaded when it is first accessed.
+
+    Months whose files can't be loaded on access are shown as empty and
+    on_error(path) is called. Their modification time doesn't match the
+    file's, so saving them backs up the unreadable file first.
+    '''
+    def __init__(self, data_dir=None, use_cache=False, on_error=None):
+        self.use_cache = use_cache
+        self.on_error = on_error
+        # Months that have been loaded or created.
+        self.loaded = {}
+        self._unloaded_files = {}
+        if data_dir is not None:
+            for path, year_number, month_number in get_journal_files(data_dir):
+                year_and_month = format_year_and_month(year_number, month_number)
+                self._unloaded_files[year_and_month] = (path, year_number, month_number)
+
+    def load_all(self, parallel=False):
+        journal_files = [self._unloaded_files[year_and_month]
+                         for year_and_month in sorted(self._unloaded_files)]
+        for month in _load_months(journal_files, parallel, self.use_cache):
+            self[format_year_and_month(month.year_number, month.month_number)] = month
+
+    def get_mtimes(self):
+        '''
+        Return a dict mapping year-month values to the modification times
+        of the corresponding month files. Months with unsaved edits map
+        to None.
+        '''
+        mtimes = {
+            year_and_month: os.path.getmtime(path)
+            for year_and_month, (path, _, _) in self._unloaded_files.items()}
+        for year_and_month, month in self.loaded.items():
+            mtimes[year_and_month] = None if month.edited else month.mtime
+        return mtimes
+
+    def __getitem__(self, year_and_month):
+        if year_and_month not in self.loaded:
+            path, year_number, month_number = self._unloaded_files[year_and_month]
+            read_contents = functools.partial(_read_month_file, path, use_cache=self.use_cache)
+            # Exiting here would lose the unsaved edits of other months.
+            month = _load_month_from_disk(
+                path, year_number, month_number, read_contents, exit_on_error=False)
+            if month is None:
+                month = Month(year_number, month_number)
+                if self.on_error:
+                    self.on_error(path)
+            self[year_and_month] = month
+        return self.loaded[year_and_month]
+
+    def __setitem__(self, year_and_month, month):
+        self._unloaded_files.pop(year_and_month, None)
+        self.loaded[year_and_month] = month
+
+    def __delitem__(self, year_and_month):
+        if year_and_month in self.loaded:
+            del self.loaded[year_and_month]
+        else:
+            del self._unloaded_files[year_and_month]
+
+    def __contains__(self, year_and_month):
+        return year_and_month in self.loaded or year_and_month in self._unloaded_files
+
+    def __iter__(self):
+        yield from list(self.loaded)
+        yield from list(self._unloaded_files)
+
+    def __len__(self):
+        return len(self.loaded) + len(self._unloaded_files)
+
+    def clear(self):
+        self.loaded.clear()
+        self._unloaded_files.clear()
+
+
+# Characters we write unescaped. Line breaks other than "\n" would be
+# normalized by the parser and the others are not printable in YAML.
+_UNSAFE_CHARS = re.compile(
+    '[^\t\n\x20-\x7E\xA0-\u2027\u202A-\uD7FF\uE000-\uFEFE\uFF00-\uFFFD\U00010000-\U0010FFFF]')
+_QUOTED_CHARS = re.compile('[\\\\"\t\n]|' + _UNSAFE_CHARS.pattern)
+_ESCAPES = {'\\': '\\\\', '"': '\\"', '\t': '\\t', '\n': '\\n', '\x00': '\\0'}
+# Strings that are safe as plain scalars unless they are one of the
+# reserved words below.
+_PLAIN_SCALAR = r'[^\W\d_][\w.-]*(?: [\w.-]+)*'
+_RESERVED_WORDS = {'yes', 'no', 'true', 'false', 'on', 'off', 'null'}
+_QUOTED_SCALAR = r'"(?:[^"\\]|\\.)*"'
+_SCALAR = '(?:%s|%s)' % (_QUOTED_SCALAR, _PLAIN_SCALAR)
+# PyYAML can't read implicit keys that are longer than 1024 characters.
+# yaml.dump() writes them in the explicit "? key" form instead.
+_MAX_KEY_LENGTH = 1024
+_DAY_LINE = re.compile(r'([1-9][0-9]*):\Z')
+_KEY_LINE = re.compile(r'  (%s):(?: (null|\|2?[-+]?|%s))?\Z' % (_SCALAR, _SCALAR))
+_ENTRY_LINE = re.compile(r'    (%s): null\Z' % _SCALAR)
+_ESCAPE_SEQUENCE = re.compile(
+    r'\\(?:x([0-9A-F]{2})|u([0-9A-F]{4})|U([0-9A-F]{8})|(.))', re.DOTALL)
+_UNESCAPES = {value[1]: key for key, value in _ESCAPES.items()}
+
+
+def _escape_char(match):
+    char = match.group()
+    if char in _ESCAPES:
+        return _ESCAPES[char]
+    code = ord(char)
+    if code <= 0xFF:
+        return '\\x%02X' % code
+    elif code <= 0xFFFF:
+        return '\\u%04X' % code
+    return '\\U%08X' % code
+
+
+def _is_plain_scalar(text):
+    return (re.fullmatch(_PLAIN_SCALAR, text) and not _UNSAFE_CHARS.search(text) and
+            text.lower() not in _RESERVED_WORDS)
+
+
+def _dump_scalar(text):
+    if _is_plain_scalar(text):
+        return text
+    return '"%s"' % _QUOTED_CHARS.sub(_escape_char, text)
+
+
+def _dump_text(text, indent):
+    if '\n' not in text or _UNSAFE_CHARS.search(text):
+        return [_dump_scalar(text)]
+    # Use a literal block like PyYAML does: add an indentation indicator if
+    # the text starts with whitespace and choose how to treat the final
+    # line breaks.
+    indicator = '2' if text[0] in ' \t\n' else ''
+    lines = text.split('\n')
+    if not text.endswith('\n'):
+        chomping = '-'
+    else:
+        chomping = '+' if text.endswith('\n\n') or text == '\n' else ''
+        lines.pop()
+    return ['|' + indicator + chomping] + [indent + line if line else '' for line in lines]
+
+
+def _dump_month(content):
     """
-    When overwriting 2014-12.txt:
-        write new content to 2014-12.new.txt
-        cp 2014-12.txt 2014-12.old.txt
-        mv 2014-12.new.txt 2014-12.txt
-        rm 2014-12.old.txt
+    Return the YAML document for the month contents or None if they don't
+    have the usual structure:
+
+        1:
+          Work:
+            meeting: null
+          text: |-
+            first line
+            second line
+
+    PyYAML reads the document back as the same contents. This is several
+    times faster than yaml.dump(), even when libyaml is available.
     """
+    if not content:
+        return '{}\n'
+    if not all(type(day_number) is int for day_number in content):
+        return None
+    lines = []
+    for day_number in sorted(content):
+        day_content = content[day_number]
+        if (not isinstance(day_content, dict) or not day_content or
+                not all(isinstance(key, str) for key in day_content)):
+            return None
+        lines.append('%d:' % day_number)
+        for key in sorted(day_content):
+            value = day_content[key]
+            dumped_key = _dump_scalar(key)
+            if len(dumped_key) >= _MAX_KEY_LENGTH:
+                return None
+            line = '  %s:' % dumped_key
+            if key == 'text' and isinstance(value, str):
+                first, *rest = _dump_text(value, '    ')
+                lines.append('%s %s' % (line, first))
+                lines.extend(rest)
+            elif value is None:
+                lines.append(line + ' null')
+            elif (isinstance(value, dict) and value and key != 'text' and
+                  all(isinstance(entry, str) and entry_value is None
+                      for entry, entry_value in value.items())):
+                lines.append(line)
+                for entry in sorted(value):
+                    dumped_entry = _dump_scalar(entry)
+                    if len(dumped_entry) >= _MAX_KEY_LENGTH:
+                        return None
+                    lines.append('    %s: null' % dumped_entry)
+            else:
+                return None
+    lines.append('')
+    return '\n'.join(lines)
+
+
+class _UnexpectedFormat(Exception):
+    pass
+
+
+def _unescape_char(match):
+    hex_code = match.group(1) or match.group(2) or match.group(3)
+    try:
+        if hex_code:
+            return chr(int(hex_code, 16))
+        return _UNESCAPES[match.group(4)]
+    except (KeyError, ValueError):
+        raise _UnexpectedFormat
+
+
+def _load_scalar(token):
+    if not token.startswith('"'):
+        if not _is_plain_scalar(token):
+            raise _UnexpectedFormat
+        return token
+    text = token[1:-1]
+    if '\t' in text:
+        raise _UnexpectedFormat
+    return _ESCAPE_SEQUENCE.sub(_unescape_char, text)
+
+
+def _load_text(header, lines):
+    if header == '|' or header in ['|-', '|+']:
+        # Without an indentation indicator, the first line must not be
+        # indented further.
+        if not lines or not lines[0] or lines[0][0] in ' \t':
+            raise _UnexpectedFormat
+    chomping = header[-1]
+    if chomping == '+':
+        return '\n'.join(lines) + '\n' if lines else ''
+    while lines and not lines[-1]:
+        lines.pop()
+    if chomping == '-':
+        return '\n'.join(lines)
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _load_month(document):
+    '''
+    Parse month files written by _dump_month() and return the contents.
+
+    Return None for all other documents. Only documents that PyYAML
+    reads as exactly the same contents are accepted.
+    '''
+    if document == '{}\n':
+        return {}
+    if not document.endswith('\n') or _UNSAFE_CHARS.search(document):
+        return None
+    lines = document[:-1].split('\n')
+    content = {}
+    day_content = None
+    entries = None
+    index = 0
+    try:
+        while index < len(lines):
+            line = lines[index]
+            index += 1
+            if entries is not None and line.startswith('    '):
+                match = _ENTRY_LINE.match(line)
+                if not match or len(match.group(1)) >= _MAX_KEY_LENGTH:
+                    return None
+                entries[_load_scalar(match.group(1))] = None
+                continue
+            entries = None
+            match = _DAY_LINE.match(line)
+            if match:
+                day_content = content[int(match.group(1))] = {}
+                continue
+            match = _KEY_LINE.match(line)
+            if not match or day_content is None or len(match.group(1)) >= _MAX_KEY_LENGTH:
+                return None
+            key = _load_scalar(match.group(1))
+            value = match.group(2)
+            if key == 'text':
+                if value is None or value == 'null':
+                    return None
+                elif value.startswith('|'):
+                    start = index
+                    while index < len(lines) and (
+                            not lines[index] or lines[index].startswith('    ')):
+                        index += 1
+                    day_content[key] = _load_text(
+                        value, [line[4:] for line in lines[start:index]])
+                else:
+                    day_content[key] = _load_scalar(value)
+            elif value is None:
+                entries = day_content[key] = {}
+            elif value == 'null':
+                day_content[key] = None
+            else:
+                return None
+    except _UnexpectedFormat:
+        return None
+    # PyYAML reads days and tags without any children as None.
+    if not all(day_content and all(value != {} for value in day_content.values())
+               for day_content in content.values()):
+        return None
+    return content
+
+
+def _fsync_dir(path):
+    '''
+    Make renames in the directory durable where the platform supports it.
+    '''
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Windows can't open directories.
+        return
+    try:
+        os.fsync(fd)
+    except OSError as err:
+        logging.debug('Could not sync directory %s: %s' % (path, err))
+    finally:
+        os.close(fd)
+
+
+# Copy of a month's contents that can be written in another thread.
+MonthSnapshot = collections.namedtuple(
+    'MonthSnapshot', ['month', 'year_and_month', 'content', 'mtime'])
+
+
+def _get_snapshot(month):
     content = {}
     for day_number, day in month.days.items():
         if not day.empty:
-            content[day_number] = day.content
+            # Days that are saved again before the results of the last
+            # save have been applied reuse its copy.
+            content[day_number] = day.get_content_copy()
+    year_and_month = format_year_and_month(month.year_number, month.month_number)
+    return MonthSnapshot(month, year_and_month, content, month.mtime)
+
+
+def _write_month_file(snapshot, journal_dir, written_mtimes=None):
+    """
+    When overwriting 2014-12.txt:
+        write new content to a temporary file like 2014-12.x8d3k.new and fsync it
+        if 2014-12.txt changed since it was loaded, back it up to
+            2014-12.CONFLICT_BACKUP<mtime>.txt
+        replace 2014-12.txt by the temporary file
+        fsync the journal directory
+
+    If anything fails before the replacement, 2014-12.txt is unchanged and
+    the temporary file is removed. The replacement is atomic, so after a
+    crash 2014-12.txt has either the old or the new content.
+
+    written_mtimes maps the files we wrote earlier to their modification
+    times. Files with these times don't conflict either. Return the stat
+    result of the new file or None if nothing had to be written.
+    """
+    if written_mtimes is None:
+        written_mtimes = {}
 
     def get_filename(infix):
-        year_and_month = format_year_and_month(month.year_number, month.month_number)
-        return os.path.join(journal_dir, '%s%s.txt' % (year_and_month, infix))
+        return os.path.join(journal_dir, '%s%s.txt' % (snapshot.year_and_month, infix))
 
-    old = get_filename('.old')
-    new = get_filename('.new')
     filename = get_filename('')
 
     # Do not save empty month files.
-    if not content and not os.path.exists(filename):
-        return False
-
-    with codecs.open(new, 'wb', encoding='utf-8') as f:
-        # Write readable unicode and no Python directives.
-        yaml.dump(content, f, Dumper=Dumper, allow_unicode=True)
-
-    if os.path.exists(filename):
-        mtime = os.path.getmtime(filename)
-        if mtime != month.mtime:
-            conflict = get_filename('.CONFLICT_BACKUP' + str(mtime))
-            logging.debug('Last edit time of %s conflicts with edit time at file load\n'
-                          '--> Backing up to %s' % (filename, conflict))
-            shutil.copy2(filename, conflict)
-        shutil.copy2(filename, old)
-    shutil.move(new, filename)
-    if os.path.exists(old):
-        os.remove(old)
+    if not snapshot.content and not os.path.exists(filename):
+        return None
 
+    # The temporary file is only readable and writable by the owner.
+    fd, new = tempfile.mkstemp(
+        dir=journal_dir, prefix=snapshot.year_and_month + '.', suffix='.new')
     try:
-        # Make file readable and writable only by the owner.
-        os.chmod(filename, stat.S_IRUSR | stat.S_IWUSR)
-    except OSError:
-        pass
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            document = _dump_month(snapshot.content)
+            if document is None:
+                # Write readable unicode and no Python directives.
+                yaml.dump(snapshot.content, f, Dumper=Dumper, allow_unicode=True)
+            else:
+                f.write(document)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if os.path.exists(filename):
+            mtime = os.path.getmtime(filename)
+            if mtime != snapshot.mtime and mtime != written_mtimes.get(filename):
+                conflict = get_filename('.CONFLICT_BACKUP' + str(mtime))
+                logging.debug('Last edit time of %s conflicts with edit time at file load\n'
+                              '--> Backing up to %s' % (filename, conflict))
+                shutil.copy2(filename, conflict)
+        os.replace(new, filename)
+    except BaseException:
+        try:
+            os.remove(new)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(journal_dir)
 
-    month.edited = False
-    month.mtime = os.path.getmtime(filename)
+    stat_result = os.stat(filename)
+    written_mtimes[filename] = stat_result.st_mtime
     logging.info('Wrote file %s' % filename)
-    return True
+    return stat_result
 
 
-def save_months_to_disk(months, journal_dir, exit_imminent=False, saveas=False):
+# saved lists (month, mtime) pairs, failed lists the months that couldn't
+# be saved because of error and size is the number of bytes written.
+SaveResult = collections.namedtuple(
+    'SaveResult', ['journal_dir', 'saved', 'failed', 'error', 'size'])
+
+
+class SaveWorker:
     '''
-    Update the journal on disk and return if something had to be written.
+    Write month files in a background thread.
+
+    The edited months are copied in the calling thread, so they can be
+    edited again while their files are written. Jobs are processed in
+    order and their results are applied to the months in get_results().
     '''
-    something_saved = False
-    for year_and_month, month in months.items():
-        # We always need to save everything when we are "saving as".
-        if month.edited or saveas:
-            something_saved |= _save_month_to_disk(month, journal_dir)
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        # Only used by the worker thread.
+        self._written_mtimes = {}
+        self._thread = None
+
+    def save(self, months, journal_dir, saveas=False, on_done=None):
+        '''
+        Queue the edited months for saving.
+
+        on_done() is called in the worker thread after the job is done.
+        '''
+        snapshots = []
+        for month in months.values():
+            # We always need to save everything when we are "saving as".
+            if month.edited or saveas:
+                snapshots.append(_get_snapshot(month))
+                # Edits made from now on mark the month as edited again.
+                month.edited = False
+        self._jobs.put((snapshots, journal_dir, on_done))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='SaveWorker')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def wait(self):
+        '''
+        Block until all queued months have been written.
+        '''
+        self._jobs.join()
+
+    def get_results(self):
+        '''
+        Apply and return the results of the finished jobs.
+
+        Months that couldn't be saved are marked as edited again. The
+        copies of the days made for the jobs are dropped, so they don't
+        take up memory until the next save.
+        '''
+        results = []
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return results
+            for month, mtime in result.saved:
+                month.mtime = mtime
+            for month in result.failed:
+                month.edited = True
+            for month in [month for month, _ in result.saved] + result.failed:
+                for day in month.days.values():
+                    day.forget_content_copy()
+            results.append(result)
 
-    return something_saved
+    def _run(self):
+        while True:
+            snapshots, journal_dir, on_done = self._jobs.get()
+            saved = []
+            written = 0
+            size = 0
+            error = None
+            try:
+                for snapshot in snapshots:
+                    stat_result = _write_month_file(snapshot, journal_dir, self._written_mtimes)
+                    if stat_result is not None:
+                        saved.append((snapshot.month, stat_result.st_mtime))
+                        size += stat_result.st_size
+                    written += 1
+            except Exception as err:
+                error = err
+            failed = [snapshot.month for snapshot in snapshots[written:]]
+            self._results.put(SaveResult(journal_dir, saved, failed, error, size))
+            try:
+                if on_done is not None:
+                    on_done()
+            finally:
+                self._jobs.task_done()
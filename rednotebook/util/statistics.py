@@ -17,38 +17,163 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------
 
+from array import array
+from collections import namedtuple
+import calendar
+import datetime
+
+
+PERIODS = ['day', 'week', 'month', 'year']
+
+# The dates are the first days of the periods. The other fields are arrays
+# with the number of words, letters and tags for each period.
+Series = namedtuple('Series', ['dates', 'words', 'chars', 'tags'])
+# Values for the days of months without edited days. Only read, never changed.
+_EMPTY_MONTH_SERIES = Series(None, *(array('I', [0] * 31) for _ in range(3)))
+
+
+def _get_period_start(date, period):
+    if period == 'day':
+        return date
+    elif period == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    elif period == 'month':
+        return date.replace(day=1)
+    elif period == 'year':
+        return date.replace(month=1, day=1)
+    raise ValueError('Unknown period: %s' % period)
+
 
 class Statistics:
+    '''
+    Journal-wide statistics.
+
+    The word and letter totals and the per-day values for each month are
+    updated whenever a day changes, so showing the statistics doesn't need
+    to look at the days' texts.
+    '''
     def __init__(self, journal):
         self.journal = journal
+        # Sorted dates of the edited days.
+        self.dates = []
+        self.clear()
+
+    def clear(self):
+        self.number_of_words = 0
+        self.number_of_chars = 0
+        # Map (year, month) to Series with one entry per day of the month.
+        self._month_series = {}
+
+    def _get_month_series(self, date):
+        key = (date.year, date.month)
+        series = self._month_series.get(key)
+        if series is None:
+            number_of_days = calendar.monthrange(date.year, date.month)[1]
+            series = Series(
+                None, *(array('I', [0] * number_of_days) for _ in range(3)))
+            self._month_series[key] = series
+        return series
+
+    def _set_day_values(self, date, words, chars, tags):
+        series = self._get_month_series(date)
+        series.words[date.day - 1] = words
+        series.chars[date.day - 1] = chars
+        series.tags[date.day - 1] = tags
+
+    def add_day(self, day):
+        self.add(day.date, day.get_number_of_words(), len(day.text), len(day.categories))
+
+    def add(self, date, words, chars, tags):
+        self.number_of_words += words
+        self.number_of_chars += chars
+        self._set_day_values(date, words, chars, tags)
+
+    def remove_day(self, day):
+        '''
+        Remove the day, which must have the content it was added with.
+        '''
+        self.number_of_words -= day.get_number_of_words()
+        self.number_of_chars -= len(day.text)
+        self._set_day_values(day.date, 0, 0, 0)
+
+    def get_series(self, period='day'):
+        '''
+        Return a Series with the numbers of words, letters and tags for
+        each day, week, month or year between the first and the last
+        edited day. Weeks start on Mondays.
+        '''
+        if period not in PERIODS:
+            raise ValueError('Unknown period: %s' % period)
+        days = Series([], array('I'), array('I'), array('I'))
+        dates = self.journal.get_dates()
+        if not dates:
+            return days
+        first_date, last_date = dates[0], dates[-1]
+        date = first_date.replace(day=1)
+        while date <= last_date:
+            number_of_days = calendar.monthrange(date.year, date.month)[1]
+            month_series = self._month_series.get((date.year, date.month), _EMPTY_MONTH_SERIES)
+            start = first_date.day - 1 if date == first_date.replace(day=1) else 0
+            end = last_date.day if date == last_date.replace(day=1) else number_of_days
+            days.dates.extend(date.replace(day=day_index + 1) for day_index in range(start, end))
+            days.words.extend(month_series.words[start:end])
+            days.chars.extend(month_series.chars[start:end])
+            days.tags.extend(month_series.tags[start:end])
+            date += datetime.timedelta(days=number_of_days)
+        if period == 'day':
+            return days
+
+        periods = Series([], array('I'), array('I'), array('I'))
+        for date, words, chars, tags in zip(*days):
+            period_start = _get_period_start(date, period)
+            if not periods.dates or periods.dates[-1] != period_start:
+                periods.dates.append(period_start)
+                periods.words.append(0)
+                periods.chars.append(0)
+                periods.tags.append(0)
+            periods.words[-1] += words
+            periods.chars[-1] += chars
+            periods.tags[-1] += tags
+        return periods
+
+    def get_longest_streak(self):
+        '''
+        Return the first date and the length of the longest run of
+        consecutive edited days. Earlier runs win ties.
+        '''
+        dates = self.journal.get_dates()
+        if not dates:
+            return None, 0
+        best_start, best_length = dates[0], 1
+        start, length = dates[0], 1
+        for previous_date, date in zip(dates, dates[1:]):
+            if (date - previous_date).days == 1:
+                length += 1
+            else:
+                start, length = date, 1
+            if length > best_length:
+                best_start, best_length = start, length
+        return best_start, best_length
 
     def get_number_of_words(self):
-        number_of_words = 0
-        for day in self.days:
-            number_of_words += day.get_number_of_words()
-        return number_of_words
+        return self.number_of_words
 
     def get_number_of_distinct_words(self):
         return len(self.journal.get_word_count_dict())
 
     def get_number_of_chars(self):
-        number_of_chars = 0
-        for day in self.days:
-            number_of_chars += len(day.text)
-        return number_of_chars
+        return self.number_of_chars
 
     def get_number_of_usage_days(self):
         '''Returns the timespan between the first and last entry'''
-        sorted_days = self.days
-        if len(sorted_days) <= 1:
-            return len(sorted_days)
-        first_day = sorted_days[0]
-        last_day = sorted_days[-1]
-        timespan = last_day.date - first_day.date
+        sorted_dates = self.dates
+        if len(sorted_dates) <= 1:
+            return len(sorted_dates)
+        timespan = sorted_dates[-1] - sorted_dates[0]
         return abs(timespan.days) + 1
 
     def get_number_of_entries(self):
-        return len(self.days)
+        return len(self.dates)
 
     def get_edit_percentage(self):
         total = self.get_number_of_usage_days()
@@ -85,8 +210,8 @@ class Statistics:
         ]
 
     def show_dialog(self, dialog):
-        self.journal.save_old_day()
-        self.days = self.journal.days
+        # This also saves the day being edited.
+        self.dates = self.journal.get_dates()
 
         day_store = dialog.day_list.get_model()
         day_store.clear()
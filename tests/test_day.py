@@ -25,3 +25,39 @@ def test_hashtags():
     assert day.hashtags == ['tag_with_longer_name']
     day.text = 'abc #tag def'
     assert day.hashtags == ['tag']
+
+
+def test_cached_values_are_updated():
+    month = Month(2000, 10)
+    day = Day(month, 20, {'text': 'a #tag'})
+    assert day.hashtags == ['tag']
+    assert day.get_number_of_words() == 3
+    day.text = 'a #new b'
+    assert day.hashtags == ['new']
+    assert day.categories == ['new']
+    assert day.get_words() == ['a', 'new', 'b', 'new']
+    day.add_category_entry('Work', 'meeting')
+    assert day.categories == ['Work', 'new']
+    assert 'meeting' in day.get_indexed_words()
+    day.content = {'text': 'c'}
+    assert day.get_words() == ['c']
+    assert day.get_number_of_words() == 1
+    # Callers may modify the returned lists.
+    day.get_words().append('d')
+    assert day.get_words() == ['c']
+
+
+def test_content_copy():
+    month = Month(2000, 10)
+    day = Day(month, 20, {'text': 'a', 'Work': {'meeting': None}})
+    content_copy = day.get_content_copy()
+    assert content_copy == day.content
+    assert day.get_content_copy() is content_copy
+    day.add_category_entry('Work', 'call')
+    assert content_copy == {'text': 'a', 'Work': {'meeting': None}}
+    assert day.get_content_copy() == day.content
+    day.text = 'b'
+    assert day.get_content_copy()['text'] == 'b'
+    content_copy = day.get_content_copy()
+    day.forget_content_copy()
+    assert day.get_content_copy() is not content_copy
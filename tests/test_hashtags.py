@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import random
 import re
 
-from rednotebook.data import HASHTAG_PATTERN
+from rednotebook.data import HASHTAG, HASHTAG_PATTERN, find_hashtags
 
 
 def test_hashtags():
@@ -43,3 +44,18 @@ def test_hashtags():
         results = re.findall(HASHTAG_PATTERN, text, flags=re.I | re.U)
         results = [hashtag for _, _hash, hashtag in results]
         assert results == tags
+        assert find_hashtags(text) == tags
+
+
+def test_find_hashtags_like_regex():
+    # Characters that play a role in HASHTAG, including some that only
+    # match case-insensitively or are digits or letters outside ASCII.
+    alphabet = [
+        '#', '\uFF03', '&', '_', ' ', '\u3000', '\n', '.', '/', '1', '9', '\u0663', '\u00b2',
+        'a', 'f', 'A', 'F', 'g', '\u00e9', '\u306e', 'i', 'I', '\u0130', '\u0131',
+        'n', 'c', 'l', 'u', 'd', 'e', 'include', 'INCLUDE', '11ff22', '12345']
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 15)))
+        expected = [hashtag for _, _hash, hashtag in HASHTAG.findall(text)]
+        assert find_hashtags(text) == expected, repr(text)
@@ -1,6 +1,14 @@
+from array import array
 import datetime
+import os
+import tempfile
 
 from rednotebook import index
+from rednotebook.data import Month
+
+
+def ordinals(*dates):
+    return array('I', sorted(date.toordinal() for date in dates))
 
 
 def test_index():
@@ -8,14 +16,282 @@ def test_index():
     date1 = datetime.date(2017, 10, 24)
     date2 = datetime.date(2017, 10, 25)
     i.add(date1, {"foo", "bar"})
-    assert i._word_to_dates == {"foo": {date1}, "bar": {date1}}
+    assert i._word_to_ordinals == {"foo": ordinals(date1), "bar": ordinals(date1)}
     assert i.find("foo") == {date1}
     i.add(date1, {"foo", "bar"})
-    assert i._word_to_dates == {"foo": {date1}, "bar": {date1}}
+    assert i._word_to_ordinals == {"foo": ordinals(date1), "bar": ordinals(date1)}
     assert i.find("foo") == {date1}
     i.add(date2, {"bar", "baz"})
-    assert i._word_to_dates == {"foo": {date1}, "bar": {date1, date2}, "baz": {date2}}
+    assert i._word_to_ordinals == {
+        "foo": ordinals(date1), "bar": ordinals(date1, date2), "baz": ordinals(date2)}
     i.remove(date1, {"foo", "bar"})
-    assert i._word_to_dates == {"bar": {date2}, "baz": {date2}}
+    assert i._word_to_ordinals == {"bar": ordinals(date2), "baz": ordinals(date2)}
     i.clear()
-    assert i._word_to_dates == {}
+    assert i._word_to_ordinals == {}
+
+
+def test_remove_unindexed_day():
+    i = index.Index()
+    date1 = datetime.date(2017, 10, 24)
+    date2 = datetime.date(2017, 10, 25)
+    i.add(date1, {"foo"})
+    i.remove(date2, {"foo", "bar"})
+    assert i._word_to_ordinals == {"foo": ordinals(date1)}
+
+
+def test_remove_month():
+    i = index.Index()
+    date1 = datetime.date(2017, 10, 24)
+    date2 = datetime.date(2017, 11, 25)
+    i.add(date1, {"foo", "bar"})
+    i.add(date2, {"bar"})
+    i.remove_month(2017, 10)
+    assert i._word_to_ordinals == {"bar": ordinals(date2)}
+
+
+def test_save_and_load():
+    i = index.Index()
+    date1 = datetime.date(2017, 10, 24)
+    date2 = datetime.date(2017, 11, 25)
+    i.add(date1, {"foo", "bar"})
+    i.add(date2, {"bar", u"bär"})
+    i.month_mtimes = {"2017-10": 1234.5, "2017-11": None}
+    assert i.edited
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "index")
+        i.save(path)
+        assert not i.edited
+        loaded = index.Index()
+        loaded.load(path)
+        assert not loaded.edited
+        assert loaded._word_to_ordinals == i._word_to_ordinals
+        assert loaded.month_mtimes == i.month_mtimes
+        loaded.remove(date1, {"foo", "bar"})
+        assert loaded.edited
+
+        with open(path, "wb") as f:
+            f.write(b"invalid")
+        loaded.load(path)
+        assert loaded._word_to_ordinals == {}
+        assert loaded.month_mtimes == {}
+
+
+def test_find_all():
+    i = index.Index()
+    dates = [datetime.date(2017, 1, 1) + datetime.timedelta(days=n) for n in range(100)]
+    for n, date in enumerate(dates):
+        words = ["all"]
+        if n % 2 == 0:
+            words.append("even")
+        if n % 3 == 0:
+            words.append("Three")
+        i.add(date, words)
+    assert i.find_all(["all"]) == dates
+    assert i.find_all(["ALL", "even", "three"]) == dates[::6]
+    assert i.find_all(["even", "missing"]) == []
+    assert i.find_all([]) == []
+
+
+def test_parse_query():
+    Term = index.Term
+    assert index.parse_query('') == []
+    assert index.parse_query('foo, bar') == [Term(['foo'], None), Term(['bar'], None)]
+    assert index.parse_query('"foo bar" baz') == [Term(['foo', 'bar'], None), Term(['baz'], None)]
+    assert index.parse_query('"foo"') == [Term(['foo'], None)]
+    assert index.parse_query('"foo bar') == [Term(['foo'], None), Term(['bar'], None)]
+    assert index.parse_query('foo NEAR/3 bar baz') == [Term(['foo', 'bar'], 3), Term(['baz'], None)]
+    assert index.parse_query('NEAR/3 foo') == [Term(['foo'], None)]
+    assert index.parse_query('"a b" NEAR/3 foo') == [Term(['a', 'b'], None), Term(['foo'], None)]
+    assert index.parse_query('near/3') == [Term(['near/3'], None)]
+
+
+def test_find_phrase():
+    text = 'The quick brown fox.\nJumps over the lazy dog, the fox.'
+
+    def find(words, distance=None):
+        return [text[start:end] for start, end in index.find_phrase(text, words, distance)]
+
+    assert find(['fox']) == ['fox', 'fox']
+    assert find(['Quick', 'brown']) == ['quick brown']
+    assert find(['brown', 'quick']) == []
+    assert find(['brown', 'fox', 'jumps']) == ['brown fox.\nJumps']
+    assert find(['the', 'fox']) == ['the fox']
+    assert find(['missing']) == []
+    assert find(['quick', 'fox'], 2) == ['quick brown fox']
+    assert find(['fox', 'quick'], 2) == ['quick brown fox']
+    assert find(['quick', 'fox'], 1) == []
+    assert find(['dog', 'fox'], 2) == ['dog, the fox']
+    text = 'fox-fox (Fox) -- foxes fox'
+    assert find(['fox']) == ['Fox', 'fox']
+    assert find(['fox-fox', 'fox']) == ['fox-fox (Fox']
+    assert find(['fox', 'foxes']) == ['Fox) -- foxes']
+
+
+def test_search():
+    month = Month(2017, 10)
+    for day_number, text in [(1, 'The quick brown fox'), (2, 'A brown dog'), (3, 'brown quick')]:
+        month.get_day(day_number).text = text
+    i = index.Index()
+    for day in month.days.values():
+        i.add_day(day)
+
+    def search(text, ranked=False):
+        results = i.search(lambda date: month.days[date.day], text, [], ranked)
+        return [(date_string, len(entries)) for date_string, entries in results]
+
+    assert search('brown') == [('2017-10-03', 1), ('2017-10-02', 1), ('2017-10-01', 1)]
+    assert search('"quick brown"') == [('2017-10-01', 1)]
+    assert search('quick brown', ranked=True) == [('2017-10-03', 2), ('2017-10-01', 2)]
+    assert search('') == []
+
+
+def test_patterns():
+    Term = index.Term
+    assert index.parse_query('meet* *eet *ee* (*ee*) a*b') == [
+        Term(['meet*'], None), Term(['*eet'], None), Term(['*ee*'], None),
+        Term(['*ee*'], None), Term(['a*b'], None)]
+
+    i = index.Index()
+    date1 = datetime.date(2017, 10, 24)
+    date2 = datetime.date(2017, 10, 25)
+    i.add(date1, ["meet", "Meeting", "sheet"])
+    i.add(date2, ["greet", "me"])
+    assert i.expand("meet*") == ["meet", "meeting"]
+    assert i.expand("*EET") == ["greet", "meet", "sheet"]
+    assert i.expand("*eet*") == ["greet", "meet", "meeting", "sheet"]
+    assert i.expand("*ti*") == ["meeting"]
+    assert i.expand("m*") == ["me", "meet", "meeting"]
+    assert i.expand("*x*") == []
+    assert i.find_all(["*eet"]) == [date1, date2]
+    assert i.find_all(["*eet", "me"]) == [date2]
+    assert i.find_all(["meet*", "me"]) == []
+
+    # The trigrams are updated incrementally.
+    i.add(date2, ["meets"])
+    assert i.expand("meet*") == ["meet", "meeting", "meets"]
+    i.remove(date1, ["meet", "Meeting", "sheet"])
+    assert i.expand("*eet*") == ["greet", "meets"]
+    assert i.find_all(["meet*"]) == [date2]
+    i.remove_month(2017, 10)
+    assert i.expand("*e*") == []
+    assert i._trigram_to_words == {}
+
+
+def test_rank():
+    i = index.Index()
+    date1 = datetime.date(2017, 10, 23)
+    date2 = datetime.date(2017, 10, 24)
+    date3 = datetime.date(2017, 10, 25)
+    date4 = datetime.date(2017, 10, 26)
+    i.add(date1, ["tea", "and", "cake", "and", "more", "cake"])
+    i.add(date2, ["tea", "tea", "tea"])
+    i.add(date3, ["tea"])
+    i.add(date4, ["coffee"])
+    assert list(i.rank(i.find_all(["tea"]), ["tea"])) == [date2, date3, date1]
+    assert list(i.rank(i.find_all(["tea", "cake"]), ["Tea", "cake"])) == [date1]
+    # Equal scores prefer newer days.
+    assert list(i.rank([date4, date3], ["milk"])) == [date4, date3]
+
+    i.remove(date2, ["tea", "tea", "tea"])
+    assert i._word_to_counts["tea"].tolist() == [1, 1]
+    assert i._total_length == 8
+    i.remove_month(2017, 10)
+    assert i._word_to_counts == {}
+    assert i._ordinal_to_length == {}
+    assert i._total_length == 0
+
+
+def test_save_and_load_term_frequencies():
+    i = index.Index()
+    date = datetime.date(2017, 10, 24)
+    i.add(date, ["tea"] * 3 + ["cake"])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "index")
+        i.save(path)
+        loaded = index.Index()
+        loaded.load(path)
+    assert loaded._word_to_counts == i._word_to_counts
+    assert loaded._ordinal_to_length == {date.toordinal(): 4}
+    assert loaded._total_length == 4
+
+
+def test_tag_index():
+    month = Month(2017, 10, {
+        23: {'text': 'a #Holiday', 'Work': {'meeting': None}},
+        24: {'text': '#holiday #holiday'},
+    })
+    day1, day2 = month.days[23], month.days[24]
+    tags = index.TagIndex()
+    tags.add_day(day1)
+    tags.add_day(day2)
+    assert tags.get_counts() == {'holiday': 2, 'Work': 1}
+    assert sorted(tags) == ['Work', 'holiday']
+
+    tags.remove_day(day2)
+    day2.text = 'no tags'
+    tags.add_day(day2)
+    assert tags.get_counts() == {'holiday': 1, 'Work': 1}
+    tags.remove_day(day1)
+    assert len(tags) == 0
+
+
+def test_month_summaries():
+    month = Month(2017, 10, {
+        1: {'text': 'Foo foo #bar', 'Work': {'meeting': None}},
+        2: {'text': ''},
+        3: {'text': 'baz'},
+    })
+    summary = index.summarize_month(month)
+    assert index.get_word_counts(summary) == {
+        'foo': 2, 'bar': 2, 'work': 1, 'meeting': 1, 'baz': 1}
+    assert summary.days == [(1, ['Work', 'bar'], 6, 12), (3, [], 1, 3)]
+    assert index.get_word_counts(index.summarize_month(Month(2017, 11))) == {}
+
+    summaries = index.MonthSummaries()
+    summaries.set('2017-10', 1234.5, summary)
+    assert summaries.edited
+    assert summaries.get('2017-10', 1234.5) == summary
+    assert summaries.get('2017-10', 1000.0) is None
+    assert summaries.get('2017-10', None) is None
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'month-summaries')
+        summaries.save(path)
+        assert not summaries.edited
+        loaded = index.MonthSummaries()
+        loaded.load(path)
+        assert list(loaded) == ['2017-10']
+        assert loaded.get('2017-10', 1234.5) == summary
+        loaded.remove('2017-10')
+        assert loaded.edited
+        assert list(loaded) == []
+
+
+def test_tag_statistics():
+    month = Month(2017, 10, {
+        1: {'text': '#project #client'},
+        2: {'text': '#Project', 'My Client': None},
+        3: {'text': '#project #client #other'},
+    })
+    month2 = Month(2017, 11, {5: {'text': '#project'}})
+    tags = index.TagIndex()
+    for day in list(month.days.values()) + list(month2.days.values()):
+        tags.add_day(day)
+
+    assert tags.get_dates('#Project') == [
+        datetime.date(2017, 10, 1), datetime.date(2017, 10, 2), datetime.date(2017, 10, 3),
+        datetime.date(2017, 11, 5)]
+    assert tags.get_monthly_counts('project') == [
+        (datetime.date(2017, 10, 1), 3), (datetime.date(2017, 11, 1), 1)]
+    assert tags.get_related('project') == [('client', 2), ('my_client', 1), ('other', 1)]
+    assert tags.get_cooccurrences() == {
+        ('client', 'other'): 1, ('client', 'project'): 2, ('my_client', 'project'): 1,
+        ('other', 'project'): 1}
+
+    day = month.days[3]
+    tags.remove_day(day)
+    day.text = '#project'
+    tags.add_day(day)
+    assert tags.get_related('project') == [('client', 1), ('my_client', 1)]
+    assert tags.get_related('other') == []
+    assert tags.get_cooccurrences() == {('client', 'project'): 1, ('my_client', 'project'): 1}
+    assert tags.get_dates('unknown') == []
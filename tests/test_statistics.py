@@ -0,0 +1,101 @@
+from array import array
+from collections import Counter
+from datetime import date
+
+import pytest
+
+from rednotebook.data import Month
+from rednotebook.util.statistics import Statistics
+
+
+class Journal:
+    def __init__(self, days):
+        self.days = days
+
+    def get_dates(self):
+        return sorted(day.date for day in self.days if not day.empty)
+
+    def get_word_count_dict(self):
+        return Counter(word.lower() for day in self.days for word in day.get_words())
+
+
+def test_statistics():
+    month = Month(2017, 10, {
+        1: {'text': 'Hello world'},
+        10: {'text': 'hello again', 'Work': None},
+        20: {'text': ''},
+    })
+    days = list(month.days.values())
+    journal = Journal(days)
+    stats = Statistics(journal)
+    for day in days:
+        stats.add_day(day)
+    stats.dates = journal.get_dates()
+
+    assert stats.get_number_of_words() == 5
+    assert stats.get_number_of_distinct_words() == 4
+    assert stats.get_number_of_chars() == 22
+    assert stats.get_number_of_entries() == 2
+    assert stats.get_number_of_usage_days() == 10
+    assert stats.get_edit_percentage() == '20.0%'
+    assert stats.get_average_number_of_words() == 2.5
+
+    day = month.days[10]
+    stats.remove_day(day)
+    day.text = 'bye'
+    stats.add_day(day)
+    assert stats.get_number_of_words() == 4
+    assert stats.get_number_of_chars() == 14
+
+    stats.clear()
+    assert stats.get_number_of_words() == 0
+
+
+def test_series():
+    journal = Journal([])
+    stats = Statistics(journal)
+    assert stats.get_series() == ([], array('I'), array('I'), array('I'))
+    assert stats.get_longest_streak() == (None, 0)
+
+    month1 = Month(2017, 12, {
+        30: {'text': 'one two'},
+        31: {'text': 'three', 'Work': None},
+    })
+    month2 = Month(2018, 1, {
+        1: {'text': 'four #tag'},
+        3: {'text': 'five'},
+    })
+    journal.days = list(month1.days.values()) + list(month2.days.values())
+    for day in journal.days:
+        stats.add_day(day)
+
+    days = stats.get_series()
+    assert days.dates == [
+        date(2017, 12, 30), date(2017, 12, 31), date(2018, 1, 1), date(2018, 1, 2),
+        date(2018, 1, 3)]
+    assert days.words.tolist() == [2, 2, 3, 0, 1]
+    assert days.chars.tolist() == [7, 5, 9, 0, 4]
+    assert days.tags.tolist() == [0, 1, 1, 0, 0]
+
+    weeks = stats.get_series('week')
+    assert weeks.dates == [date(2017, 12, 25), date(2018, 1, 1)]
+    assert weeks.words.tolist() == [4, 4]
+    months = stats.get_series('month')
+    assert months.dates == [date(2017, 12, 1), date(2018, 1, 1)]
+    assert months.tags.tolist() == [1, 1]
+    years = stats.get_series('year')
+    assert years.dates == [date(2017, 1, 1), date(2018, 1, 1)]
+    assert years.chars.tolist() == [12, 13]
+    with pytest.raises(ValueError):
+        stats.get_series('decade')
+
+    assert stats.get_longest_streak() == (date(2017, 12, 30), 3)
+
+    month3 = Month(2018, 3, {1: {'text': 'six'}})
+    journal.days.append(month3.days[1])
+    stats.add_day(month3.days[1])
+    days = stats.get_series()
+    assert len(days.dates) == len(days.words) == 2 + 31 + 28 + 1
+    assert days.words.tolist()[-30:] == [0] * 29 + [1]
+    # Months without edited days are not stored.
+    assert (2018, 2) not in stats._month_series
@@ -0,0 +1,386 @@
+import os
+import random
+import tempfile
+import threading
+
+import pytest
+
+import yaml
+
+from rednotebook import storage
+from rednotebook.data import Month
+
+
+def _save(month, journal_dir):
+    month.edited = True
+    year_and_month = storage.format_year_and_month(month.year_number, month.month_number)
+    worker = storage.SaveWorker()
+    worker.save({year_and_month: month}, journal_dir)
+    worker.wait()
+    result, = worker.get_results()
+    assert result.saved and not result.error
+
+
+def _write_months(journal_dir, number_of_months):
+    for month_number in range(1, number_of_months + 1):
+        month = Month(2017, month_number)
+        for day_number in range(1, 4):
+            day = month.get_day(day_number)
+            day.text = 'Text for %s' % day
+            day.add_category_entry('Work', 'entry %d' % day_number)
+        # Don't start a save worker thread, since it prevents parallel loading.
+        assert storage._write_month_file(storage._get_snapshot(month), journal_dir)
+
+
+def _get_contents(months):
+    return {
+        year_and_month: {number: day.content for number, day in month.days.items()}
+        for year_and_month, month in months.items()}
+
+
+def test_load_in_parallel():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 12)
+        sequential = storage.load_all_months_from_disk(journal_dir)
+        parallel = storage.load_all_months_from_disk(journal_dir, parallel=True)
+        assert len(sequential) == 12
+        assert _get_contents(sequential) == _get_contents(parallel)
+        for year_and_month, month in parallel.items():
+            assert month.mtime == sequential[year_and_month].mtime
+            assert not month.edited
+
+
+def test_no_parallel_loading_with_threads(monkeypatch):
+    with monkeypatch.context() as m:
+        # The number of threads is unknown.
+        m.setattr(storage.os, 'listdir', _fail)
+        assert storage._get_process_context() is None
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert storage._get_process_context() is None
+    finally:
+        stop.set()
+        thread.join()
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_abort_on_corrupt_file(parallel):
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 3)
+        path = os.path.join(journal_dir, '2017-02.txt')
+        with open(path, 'w') as f:
+            f.write('1: {text: "unterminated\n')
+        with pytest.raises(SystemExit):
+            storage.load_all_months_from_disk(journal_dir, parallel=parallel)
+        with open(path) as f:
+            assert f.read() == '1: {text: "unterminated\n'
+
+
+def _load_with_cache(journal_dir):
+    return storage.load_all_months_from_disk(journal_dir, use_cache=True)
+
+
+def _age_files(journal_dir):
+    # Only files that have not been modified recently are cached.
+    old = os.path.getmtime(journal_dir) - 10 * storage.MIN_CACHE_AGE
+    for path, _, _ in storage.get_journal_files(journal_dir):
+        os.utime(path, (old, old))
+
+
+def test_cache(monkeypatch):
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 2)
+        _age_files(journal_dir)
+        uncached = storage.load_all_months_from_disk(journal_dir)
+        assert _get_contents(_load_with_cache(journal_dir)) == _get_contents(uncached)
+        assert len(os.listdir(storage.get_cache_dir(journal_dir))) == 2
+
+        def fail(path):
+            raise AssertionError('%s should not be parsed' % path)
+        with monkeypatch.context() as m:
+            m.setattr(storage, '_parse_month_file', fail)
+            assert _get_contents(_load_with_cache(journal_dir)) == _get_contents(uncached)
+
+
+def test_outdated_cache():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 1)
+        _age_files(journal_dir)
+        _load_with_cache(journal_dir)
+        path = os.path.join(journal_dir, '2017-01.txt')
+        mtime = os.path.getmtime(path)
+        with open(path, 'w') as f:
+            f.write('2: {text: changed}\n')
+        os.utime(path, (mtime, mtime))
+        months = _load_with_cache(journal_dir)
+        assert _get_contents(months) == {'2017-01': {2: {'text': 'changed'}}}
+
+
+def test_corrupt_cache():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 1)
+        _age_files(journal_dir)
+        uncached = storage.load_all_months_from_disk(journal_dir)
+        _load_with_cache(journal_dir)
+        cache_file = storage._get_cache_file(os.path.join(journal_dir, '2017-01.txt'))
+        with open(cache_file, 'rb') as f:
+            cache = bytearray(f.read())
+        for corrupt_cache in [cache[:len(cache) // 2], cache.replace(b'Text', b'Test'), b'']:
+            with open(cache_file, 'wb') as f:
+                f.write(corrupt_cache)
+            assert _get_contents(_load_with_cache(journal_dir)) == _get_contents(uncached)
+
+
+def test_lazy_months():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 3)
+        eager = storage.load_all_months_from_disk(journal_dir)
+        months = storage.LazyMonths(journal_dir)
+        assert len(months) == 3
+        assert '2017-02' in months
+        assert not months.loaded
+        assert months['2017-02'].days[1].text == 'Text for 2017-02-01'
+        assert list(months.loaded) == ['2017-02']
+        months['2017-04'] = Month(2017, 4)
+        assert len(months) == 4
+        assert _get_contents(months.loaded) == {
+            '2017-02': _get_contents(eager)['2017-02'], '2017-04': {}}
+        months.load_all()
+        assert len(months.loaded) == len(months) == 4
+        assert _get_contents(months) == dict(_get_contents(eager), **{'2017-04': {}})
+        del months['2017-01']
+        assert sorted(months) == ['2017-02', '2017-03', '2017-04']
+        months.clear()
+        assert not months
+
+
+def test_lazy_months_corrupt_file():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 2)
+        path = os.path.join(journal_dir, '2017-02.txt')
+        with open(path, 'w') as f:
+            f.write('1: {text: "unterminated\n')
+        errors = []
+        months = storage.LazyMonths(journal_dir, on_error=errors.append)
+        month = months['2017-02']
+        assert errors == [path]
+        assert not month.days
+        # Saving the month keeps a backup of the unreadable file.
+        month.get_day(1).text = 'new'
+        assert storage._write_month_file(storage._get_snapshot(month), journal_dir)
+        backups = [name for name in os.listdir(journal_dir) if 'CONFLICT_BACKUP' in name]
+        assert len(backups) == 1
+        with open(os.path.join(journal_dir, backups[0])) as f:
+            assert f.read() == '1: {text: "unterminated\n'
+
+
+def _get_month(text):
+    month = Month(2017, 1)
+    month.get_day(1).text = text
+    month.edited = True
+    return month
+
+
+def _fail(*args, **kwargs):
+    raise OSError('simulated failure')
+
+
+@pytest.mark.parametrize('module, function', [
+    (storage, '_dump_month'),
+    (storage.os, 'fsync'),
+    (storage.shutil, 'copy2'),
+    (storage.os, 'replace'),
+])
+def test_failed_save_keeps_old_file(monkeypatch, module, function):
+    with tempfile.TemporaryDirectory() as journal_dir:
+        month = _get_month('old')
+        _save(month, journal_dir)
+        month.get_day(1).text = 'new'
+        if function == 'copy2':
+            # Only conflicts are backed up.
+            month.mtime -= 10
+        monkeypatch.setattr(module, function, _fail)
+        with pytest.raises(OSError):
+            storage._write_month_file(storage._get_snapshot(month), journal_dir)
+        monkeypatch.undo()
+
+        assert os.listdir(journal_dir) == ['2017-01.txt']
+        loaded = storage.load_all_months_from_disk(journal_dir)
+        assert loaded['2017-01'].get_day(1).text == 'old'
+
+
+def test_remove_temporary_files():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        _write_months(journal_dir, 1)
+        names = ['2017-01.x8d3k.new', '2017-02.ab_cd.new', 'notes.new', '2017-01.txt~']
+        for name in names:
+            with open(os.path.join(journal_dir, name), 'w') as f:
+                f.write('temporary')
+        assert [storage.is_temporary_file(name) for name in names] == [True, True, False, False]
+        storage.remove_temporary_files(journal_dir)
+        assert sorted(os.listdir(journal_dir)) == ['2017-01.txt', '2017-01.txt~', 'notes.new']
+
+
+def test_failing_directory_sync_is_ignored(monkeypatch):
+    with tempfile.TemporaryDirectory() as journal_dir:
+        monkeypatch.setattr(storage.os, 'fsync', _fail)
+        storage._fsync_dir(journal_dir)
+
+
+def test_conflict_backup():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        month = _get_month('old')
+        _save(month, journal_dir)
+        # Simulate a change by another program.
+        month.mtime -= 10
+        month.get_day(1).text = 'new'
+        _save(month, journal_dir)
+        files = sorted(os.listdir(journal_dir))
+        assert len(files) == 2
+        assert files[0].startswith('2017-01.CONFLICT_BACKUP')
+        assert files[1] == '2017-01.txt'
+
+
+def test_save_worker():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        month = _get_month('first')
+        worker = storage.SaveWorker()
+        worker.save({'2017-01': month}, journal_dir)
+        assert not month.edited
+        # Edits after queueing the job don't end up in the file.
+        month.get_day(1).text = 'second'
+        month.edited = True
+        # The second job doesn't see the new mtime yet, but there is no conflict.
+        worker.save({'2017-01': month}, journal_dir)
+        worker.wait()
+
+        results = worker.get_results()
+        assert [len(result.saved) for result in results] == [1, 1]
+        assert not any(result.error for result in results)
+        assert not month.edited
+        assert month.mtime == os.path.getmtime(os.path.join(journal_dir, '2017-01.txt'))
+        # The copies made for saving are dropped.
+        assert 'content' not in month.get_day(1)._cache
+        assert os.listdir(journal_dir) == ['2017-01.txt']
+        loaded = storage.load_all_months_from_disk(journal_dir)
+        assert loaded['2017-01'].get_day(1).text == 'second'
+        assert worker.get_results() == []
+
+
+def test_save_worker_failure(monkeypatch):
+    with tempfile.TemporaryDirectory() as journal_dir:
+        month = _get_month('text')
+        calls = []
+        monkeypatch.setattr(storage.os, 'replace', _fail)
+        worker = storage.SaveWorker()
+        worker.save({'2017-01': month}, journal_dir, on_done=lambda: calls.append(True))
+        worker.wait()
+        monkeypatch.undo()
+
+        result, = worker.get_results()
+        assert isinstance(result.error, OSError)
+        assert result.saved == []
+        assert result.failed == [month]
+        assert month.edited
+        assert os.listdir(journal_dir) == []
+        assert calls == [True]
+
+
+def test_dump_month():
+    content = {
+        2: {'text': 'no newline'},
+        1: {'text': 'first\nsecond\n', 'Work': {'meeting': None, 'yes': None}, 'null': None},
+        3: {'text': '  indented\n\n'},
+    }
+    assert storage._dump_month(content) == (
+        '1:\n'
+        '  Work:\n'
+        '    meeting: null\n'
+        '    "yes": null\n'
+        '  "null": null\n'
+        '  text: |\n'
+        '    first\n'
+        '    second\n'
+        '2:\n'
+        '  text: no newline\n'
+        '3:\n'
+        '  text: |2+\n'
+        '      indented\n'
+        '\n')
+    assert storage._dump_month({}) == '{}\n'
+    # Other structures are left to yaml.dump().
+    assert storage._dump_month({1: {'text': 'a', 'Work': {'meeting': 'notes'}}}) is None
+    assert storage._dump_month({'1': {'text': 'a'}}) is None
+
+
+@pytest.mark.parametrize('content', [
+    {1: {'text': 'a', 'Work': {'x' * 1030: None}}},
+    {1: {'text': 'a', 'x' * 1030: None}},
+    {1: {'text': 'a', 'Work': {'"' * 600: None}}},
+])
+def test_dump_month_long_keys(content):
+    # PyYAML can't read implicit keys longer than 1024 characters.
+    assert storage._dump_month(content) is None
+    with tempfile.TemporaryDirectory() as journal_dir:
+        month = Month(2017, 1, content)
+        assert storage._write_month_file(storage._get_snapshot(month), journal_dir)
+        with open(os.path.join(journal_dir, '2017-01.txt')) as f:
+            assert yaml.load(f, Loader=yaml.Loader) == content
+
+
+def _get_random_text(rng, max_length):
+    alphabet = [
+        'a', 'Z', '1', '.', '\u00e4', '\u65e5', '\U0001F600', ' ', '  ', '\t', '\n',
+        '\n\n', '\r', '\x00', '\x85', '\u2028', '\ufeff', '#', ':', '-', '---', '"',
+        "'", '\\', '|', '>', '~', '%', '@', '&', '*', '!', '{', '[', ',', '?', 'yes', 'null']
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randrange(max_length)))
+
+
+@pytest.mark.parametrize('loader', [yaml.Loader, storage.Loader])
+def test_dump_month_round_trip(loader):
+    rng = random.Random(0)
+    for _ in range(1000):
+        content = {}
+        for day_number in rng.sample(range(1, 32), rng.randrange(1, 4)):
+            day_content = content[day_number] = {'text': _get_random_text(rng, 30)}
+            for _ in range(rng.randrange(3)):
+                entries = [_get_random_text(rng, 6) for _ in range(rng.randrange(3))]
+                category = _get_random_text(rng, 6)
+                if category != 'text':
+                    day_content[category] = dict.fromkeys(entries) if entries else None
+        document = storage._dump_month(content)
+        assert yaml.load(document, Loader=loader) == content, document
+        assert storage._load_month(document) == content, document
+
+
+@pytest.mark.parametrize('document', [
+    # Written by yaml.dump().
+    "1:\n  text: 'first\n\n    second'\n",
+    "1: {text: a}\n",
+    '1:\n  text: a\r\n',
+    '1:\n  text: a # comment\n',
+    '01:\n  text: a\n',
+    '1:\n  text: yes\n',
+    '1:\n  text: null\n',
+    '1:\n  text: |\n      indented\n',
+    '1:\n  text: "\\q"\n',
+    '1:\n',
+    '1:\n  text: a\n  Work:\n',
+    '1:\n  text: a\n  Work: entry\n',
+    # PyYAML can't read implicit keys longer than 1024 characters.
+    '1:\n  text: a\n  %s: null\n' % ('x' * 1030),
+    '1:\n  text: a\n  Work:\n    %s: null\n' % ('x' * 1030),
+    '1:\n  text: a\n  Work:\n    "%s": null\n' % ('x' * 1030),
+])
+def test_load_month_falls_back(document):
+    assert storage._load_month(document) is None
+
+
+def test_parse_month_file_falls_back():
+    with tempfile.TemporaryDirectory() as journal_dir:
+        path = os.path.join(journal_dir, '2017-01.txt')
+        with open(path, 'w') as f:
+            f.write("1:\n  text: 'first\n\n    second'\n")
+        assert storage._parse_month_file(path) == {1: {'text': 'first\nsecond'}}